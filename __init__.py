@@ -1,44 +1,42 @@
-"""template monkey patching"""
-from datetime import date, timedelta
-from os import path
-import ssl
+"""template helpers"""
+from jinja2 import defaults as jinja_defaults
 
-from homeassistant.helpers.template import TemplateEnvironment
-from homeassistant.util import ssl as hassl
 
+class _LazyHelper:
+    """Template global that imports its implementation on first use."""
 
-def nth_day(year, month, dow, week):
-    """Determine the nth weekday of a month."""
-    date_time = date(year, month, 1)
-    delta = 0
-    if date_time.weekday() <= dow:
-        delta = dow - date_time.weekday()
-    else:
-        delta = (7 - date_time.weekday()) + dow
+    __slots__ = ("_name", "_func")
 
-    date_time = date(year, month, 1 + 7 * (week - 1))
-    return date_time + timedelta(days=delta)
+    def __init__(self, name):
+        self._name = name
+        self._func = None
 
+    def __call__(self, *args, **kwargs):
+        if self._func is None:
+            from . import templates  # pylint: disable=import-outside-toplevel
 
-old_init = TemplateEnvironment.__init__
+            self._func = getattr(templates, self._name)
+        return self._func(*args, **kwargs)
 
-def new_init(self, hass, limited=False, strict=False):
-    """Initialize the jinja2 environment."""
-    old_init(self, hass, limited, strict)
-    self.globals["nth_day"] = nth_day
+    def __repr__(self):
+        return f"<template helper {self._name}>"
 
 
-TemplateEnvironment.__init__ = new_init
+_TEMPLATE_HELPERS = ("nth_day", "last_day", "easter")
 
-old_client_context = hassl.client_context
 
+def register_template_helpers():
+    """Make the template helpers available to every jinja2 environment.
 
-def new_client_context() -> ssl.SSLContext:
-    context = old_client_context()
-    caFile = f"{path.dirname(__file__)}/../ca-cert.pem"
-    if path.exists(caFile):
-        context.load_verify_locations(caFile)
-    return context
+    Every environment copies jinja2's default namespace when it is created,
+    so adding the helpers there once replaces patching
+    TemplateEnvironment.__init__.  Calling this more than once is a no-op.
+    """
+    namespace = jinja_defaults.DEFAULT_NAMESPACE
+    for name in _TEMPLATE_HELPERS:
+        if not isinstance(namespace.get(name), _LazyHelper):
+            namespace[name] = _LazyHelper(name)
 
 
-hassl.client_context = new_client_context
+register_template_helpers()
+
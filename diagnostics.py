@@ -0,0 +1,96 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Diagnostic sensors and services exposing the instrumentation stats."""
+
+import json
+import logging
+
+from homeassistant.helpers.entity import Entity
+
+from .instrumentation import STATS
+
+_LOGGER = logging.getLogger(__name__)
+
+CONF_DIAGNOSTICS = "diagnostics"
+DATA_DIAGNOSTICS = "custom_components_diagnostics"
+SERVICE_DUMP_STATS = "dump_stats"
+
+
+async def async_setup_diagnostics(hass, domain, async_add_entities=None):
+    """Enable recording and expose the stats for domain.
+
+    A diagnostic sensor is added (when async_add_entities is given) and the
+    <domain>.dump_stats service is registered, once per domain no matter how
+    many platform entries enable diagnostics.
+    """
+    STATS.enabled = True
+    domains = hass.data.setdefault(DATA_DIAGNOSTICS, set())
+    if domain in domains:
+        return
+    domains.add(domain)
+
+    async def async_dump_stats(call):
+        """Log the recorded stats."""
+        prefix = "" if call.data.get("all") else f"{domain}."
+        _LOGGER.info(
+            "%s stats: %s", domain, json.dumps(STATS.snapshot(prefix), indent=2)
+        )
+
+    hass.services.async_register(domain, SERVICE_DUMP_STATS, async_dump_stats)
+
+    if async_add_entities is not None:
+        async_add_entities([DiagnosticsSensor(domain)])
+
+
+class DiagnosticsSensor(Entity):
+    """Sensor that presents the recorded stats for one component."""
+
+    def __init__(self, domain):
+        """Initialize the sensor."""
+        self._domain = domain
+        self._prefix = f"{domain}."
+        self._state = 0
+        self._attributes = {}
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._domain} diagnostics"
+
+    @property
+    def unique_id(self):
+        """Return unique ID for this sensor."""
+        return f"{self._domain}_diagnostics"
+
+    @property
+    def state(self):
+        """Return the number of recorded samples."""
+        return self._state
+
+    @property
+    def device_state_attributes(self):
+        """Return the recorded histograms, counters and gauges."""
+        return self._attributes
+
+    async def async_update(self):
+        """Refresh the stats snapshot."""
+        snapshot = STATS.snapshot(self._prefix)
+        self._state = sum(
+            histogram["count"] for histogram in snapshot["histograms"].values()
+        )
+        self._attributes = {
+            **snapshot["histograms"],
+            **snapshot["counters"],
+            **snapshot["gauges"],
+        }
@@ -0,0 +1,133 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Rolling min/max/mean over a time window."""
+
+from collections import deque
+
+DEFAULT_BUCKETS = 60
+
+
+class RollingWindow:
+    """Min, max and mean of the values added in the last duration seconds.
+
+    The window is a ring of a fixed number of buckets, each covering
+    duration / buckets seconds, so the window moves a bucket at a time.
+    Every bucket keeps its sum and count for a running sum, and monotonic
+    deques of (bucket, value) give the min and max.  Adding a value costs
+    O(1) amortized and the memory used doesn't depend on the number of
+    values added.
+    """
+
+    __slots__ = (
+        "duration",
+        "_resolution",
+        "_buckets",
+        "_sums",
+        "_counts",
+        "_sum",
+        "_count",
+        "_current",
+        "_min",
+        "_max",
+    )
+
+    def __init__(self, duration, buckets=DEFAULT_BUCKETS):
+        self.duration = duration
+        self._resolution = duration / buckets
+        self._buckets = buckets
+        self._sums = [0.0] * buckets
+        self._counts = [0] * buckets
+        self._sum = 0.0
+        self._count = 0
+        self._current = None
+        self._min = deque()
+        self._max = deque()
+
+    def _advance(self, bucket):
+        """Move the window to end at bucket, dropping the buckets left behind."""
+        if self._current is not None and bucket <= self._current:
+            return
+
+        start = bucket - self._buckets + 1
+        if self._current is None or start > self._current:
+            expired = range(self._buckets)
+        else:
+            expired = (
+                index % self._buckets for index in range(self._current + 1, bucket + 1)
+            )
+        for index in expired:
+            self._sum -= self._sums[index]
+            self._count -= self._counts[index]
+            self._sums[index] = 0.0
+            self._counts[index] = 0
+        if self._count == 0:
+            # keep rounding errors from piling up in the running sum
+            self._sum = 0.0
+        self._current = bucket
+
+        for extremes in (self._min, self._max):
+            while extremes and extremes[0][0] < start:
+                extremes.popleft()
+
+    def add(self, timestamp, value):
+        """Add a value measured at timestamp (seconds, not decreasing)."""
+        bucket = int(timestamp // self._resolution)
+        self._advance(bucket)
+        # a late value is counted in the current bucket
+        bucket = self._current
+        index = bucket % self._buckets
+        self._sums[index] += value
+        self._counts[index] += 1
+        self._sum += value
+        self._count += 1
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        # a smaller value in the same bucket expires with this one, keeping
+        # one entry per bucket bounds the deques by the number of buckets
+        if not self._min or self._min[-1][0] != bucket:
+            self._min.append((bucket, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        if not self._max or self._max[-1][0] != bucket:
+            self._max.append((bucket, value))
+
+    def expire(self, timestamp):
+        """Drop the values that are out of the window at timestamp.
+
+        Returns True when any value was dropped.
+        """
+        count = self._count
+        self._advance(int(timestamp // self._resolution))
+        return self._count != count
+
+    @property
+    def resolution(self):
+        """Seconds covered by a bucket, the window moves in these steps."""
+        return self._resolution
+
+    @property
+    def min(self):
+        """Smallest value in the window, None when it is empty."""
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        """Largest value in the window, None when it is empty."""
+        return self._max[0][1] if self._max else None
+
+    @property
+    def mean(self):
+        """Mean of the values in the window, None when it is empty."""
+        return self._sum / self._count if self._count else None
@@ -0,0 +1,134 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the rolling window aggregates."""
+
+from datetime import datetime, timedelta
+import random
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import MagicMock, patch
+
+from homeassistant.const import STATE_UNAVAILABLE, TEMP_FAHRENHEIT
+from homeassistant.util import dt as dt_util
+
+from ..simulation import Simulation
+
+from .rolling import RollingWindow
+from .sensor import FeelsLikeSensor, window_name
+
+
+class TestRollingWindow(TestCase):
+    def test_empty(self):
+        window = RollingWindow(3600)
+        self.assertIsNone(window.min)
+        self.assertIsNone(window.max)
+        self.assertIsNone(window.mean)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        window = RollingWindow(600, buckets=10)
+        values = []
+        timestamp = 0.0
+        for _ in range(5000):
+            timestamp += rng.expovariate(1 / 20)
+            value = rng.uniform(-10, 110)
+            window.add(timestamp, value)
+            values.append((timestamp, value))
+
+            # the window holds the buckets of the last 600 seconds
+            start = (int(timestamp // 60) - 9) * 60
+            expected = [value for at, value in values if at >= start]
+            self.assertEqual(min(expected), window.min)
+            self.assertEqual(max(expected), window.max)
+            self.assertAlmostEqual(sum(expected) / len(expected), window.mean)
+
+    def test_bounded(self):
+        window = RollingWindow(60, buckets=6)
+        for second in range(10000):
+            window.add(second / 100, second)
+        # one entry per bucket at most, whatever the number of values
+        self.assertLessEqual(len(window._max), 6)
+        self.assertLessEqual(len(window._min), 6)
+        self.assertEqual(window.max, 9999)
+
+    def test_expire(self):
+        window = RollingWindow(60, buckets=6)
+        window.add(0, 1)
+        window.add(30, 3)
+        window.expire(65)
+        self.assertEqual((3, 3, 3), (window.min, window.max, window.mean))
+        window.expire(1000)
+        self.assertEqual((None, None, None), (window.min, window.max, window.mean))
+
+
+class TestFeelsLikeWindows(TestCase):
+    def test_window_name(self):
+        self.assertEqual("1h", window_name(timedelta(hours=1)))
+        self.assertEqual("24h", window_name(timedelta(days=1)))
+        self.assertEqual("15m", window_name(timedelta(minutes=15)))
+        self.assertEqual("90s", window_name(timedelta(seconds=90)))
+
+    def test_attributes(self):
+        sensor = FeelsLikeSensor(
+            MagicMock(), "test", "sensor.temp", "sensor.humidity", 1, [timedelta(hours=1)]
+        )
+        sensor.async_schedule_update_ha_state = MagicMock()
+        now = datetime(2021, 7, 1, 12, tzinfo=dt_util.UTC)
+        with patch.object(dt_util, "utcnow", return_value=now):
+            self.assertEqual(
+                {"min_1h": None, "max_1h": None, "mean_1h": None},
+                sensor.device_state_attributes,
+            )
+
+        sensor._humidity = 50
+        for minutes, temp in ((0, 70), (40, 74), (90, 71)):
+            sensor._temp = temp
+            with patch.object(
+                dt_util, "utcnow", return_value=now + timedelta(minutes=minutes)
+            ):
+                sensor._update_internal_state()
+
+        with patch.object(dt_util, "utcnow", return_value=now + timedelta(minutes=90)):
+            self.assertEqual(
+                {"min_1h": 71, "max_1h": 74, "mean_1h": 72.5},
+                sensor.device_state_attributes,
+            )
+
+
+class TestFeelsLikeExpire(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+
+    async def test_quiet_sources(self):
+        temp, humidity = "sensor.temperature", "sensor.humidity"
+        self.sim.set_state(temp, 70, {"unit_of_measurement": TEMP_FAHRENHEIT})
+        self.sim.set_state(humidity, 50, {"unit_of_measurement": "%"})
+        sensor = FeelsLikeSensor(
+            self.sim.hass, "Feels Like", temp, humidity, 2, [timedelta(hours=1)]
+        )
+        await self.sim.async_add_entities([sensor])
+        await self.sim.async_run(timedelta(minutes=30))
+        self.sim.set_state(humidity, STATE_UNAVAILABLE)
+        await self.sim.async_run(timedelta(minutes=29))
+        self.assertEqual(70, sensor.device_state_attributes["max_1h"])
+
+        # no new values, the old ones drop out once they leave the window
+        self.sim.reset()
+        await self.sim.async_run(timedelta(minutes=2))
+        self.assertEqual(
+            {"min_1h": None, "max_1h": None, "mean_1h": None},
+            sensor.device_state_attributes,
+        )
+        self.assertEqual(1, self.sim.counts["sensor.feels_like"]["state_writes"])
@@ -13,23 +13,44 @@
 # limitations under the License.
 """Platform for sensor integration."""
 
+from datetime import timedelta
+
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 
-from homeassistant.const import ATTR_NAME, TEMP_FAHRENHEIT
-from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.const import (
+    ATTR_NAME,
+    ATTR_UNIT_OF_MEASUREMENT,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    TEMP_FAHRENHEIT,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.event import (
+    async_track_state_change,
+    async_track_time_interval,
+)
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.util import dt as dt_util
 from homeassistant.util.temperature import convert as convert_temperature
 
 import logging
 
+from ..diagnostics import CONF_DIAGNOSTICS, async_setup_diagnostics
+from ..instrumentation import timed
+from ..profiling import async_register_profile_service, profiled
+from .rolling import RollingWindow
+
 _LOGGER = logging.getLogger(__name__)
 
+DOMAIN = "feels_like"
+
 DEFAULT_DECIMALS = 2
 
 CONF_TEMP = "temp_sensor"
 CONF_HUMIDITY = "humidity_sensor"
 CONF_DECIMALS = "decimals"
+CONF_WINDOWS = "windows"
 
 PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
     {
@@ -37,53 +58,130 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
         vol.Required(CONF_TEMP): str,
         vol.Required(CONF_HUMIDITY): str,
         vol.Optional(CONF_DECIMALS, default=DEFAULT_DECIMALS): cv.positive_int,
+        vol.Optional(CONF_WINDOWS, default=[]): vol.All(
+            cv.ensure_list, [vol.All(cv.time_period, cv.positive_timedelta)]
+        ),
+        vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean,
     }
 )
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the sensor platform."""
+    if config.get(CONF_DIAGNOSTICS):
+        await async_setup_diagnostics(hass, DOMAIN, async_add_entities)
+    async_register_profile_service(hass, DOMAIN)
+
     sensor = FeelsLikeSensor(
         hass,
         config[ATTR_NAME],
         config[CONF_TEMP],
         config[CONF_HUMIDITY],
         config[CONF_DECIMALS],
+        config[CONF_WINDOWS],
     )
     async_add_entities([sensor])
 
 
 def convert(state):
+    """Convert a source state to a humidity or Fahrenheit temperature.
+
+    Returns None for missing, unknown and unavailable states, a value
+    without a unit of measurement is used as is.
+    """
+    if state is None or state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+        return None
+
     val = 0.0
     try:
         val = float(state.state)
     except ValueError:
         return None
 
-    if state.attributes["unit_of_measurement"] == "%":
+    unit = state.attributes.get(ATTR_UNIT_OF_MEASUREMENT)
+    if unit is None or unit in ("%", TEMP_FAHRENHEIT):
         return val
 
-    return convert_temperature(val, state.attributes["unit_of_measurement"], TEMP_FAHRENHEIT)
+    try:
+        return convert_temperature(val, unit, TEMP_FAHRENHEIT)
+    except ValueError:
+        _LOGGER.warning("%s has unsupported unit %s", state.entity_id, unit)
+        return None
+
+
+def window_name(window):
+    """Name a rolling window for its attributes, e.g. 1h or 15m."""
+    seconds = int(window.total_seconds())
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
 
-class FeelsLikeSensor(Entity):
+
+class FeelsLikeSensor(RestoreEntity):
     """Sensor that presents the current slot for a configured schedule."""
 
-    def __init__(self, hass, name, temp_sensor, humidity_sensor, decimals):
-        """Initialize the sensor."""
+    def __init__(self, hass, name, temp_sensor, humidity_sensor, decimals, windows=()):
+        """Initialize the sensor.
+
+        windows are the timedeltas to keep the rolling min, max and mean for.
+        """
         self.hass = hass
         self._name = name
         self._temp_sensor = temp_sensor
         self._humidity_sensor = humidity_sensor
         self._decimals = decimals
+        self._windows = {
+            window_name(window): RollingWindow(window.total_seconds())
+            for window in windows
+        }
 
         self._temp = None
         self._humidity = None
         self._state = None
+        self._unsub_expire = None
     
     async def async_added_to_hass(self):
+        """Start out from the current source states, or the last known state.
+
+        The last state is only used until both sources have a value.
+        """
+        last_state = await self.async_get_last_state()
+        if last_state is not None:
+            try:
+                self._state = float(last_state.state)
+            except ValueError:
+                pass
+
+        self._temp = convert(self.hass.states.get(self._temp_sensor))
+        self._humidity = convert(self.hass.states.get(self._humidity_sensor))
+        self._update_internal_state()
+
         async_track_state_change(self.hass, [self._temp_sensor], self.async_update_temp)
         async_track_state_change(self.hass, [self._humidity_sensor], self.async_update_humidity)
 
+        if self._windows:
+            # values must drop out of the windows even if the sources go quiet
+            resolution = min(window.resolution for window in self._windows.values())
+            self._unsub_expire = async_track_time_interval(
+                self.hass, self._async_expire, timedelta(seconds=resolution)
+            )
+
+    async def async_will_remove_from_hass(self):
+        """Stop expiring the rolling windows."""
+        if self._unsub_expire is not None:
+            self._unsub_expire()
+            self._unsub_expire = None
+
+    @callback
+    def _async_expire(self, now):
+        """Write the state when values dropped out of a rolling window."""
+        timestamp = now.timestamp()
+        expired = [window.expire(timestamp) for window in self._windows.values()]
+        if any(expired):
+            self.async_write_ha_state()
+
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -94,20 +192,48 @@ class FeelsLikeSensor(Entity):
         """Return the state of the sensor."""
         return self._state
 
+    @property
+    def device_state_attributes(self):
+        """Return the rolling min, max and mean of the state."""
+        if not self._windows:
+            return None
+
+        attributes = {}
+        timestamp = dt_util.utcnow().timestamp()
+        for name, window in self._windows.items():
+            window.expire(timestamp)
+            mean = window.mean
+            attributes[f"min_{name}"] = window.min
+            attributes[f"max_{name}"] = window.max
+            attributes[f"mean_{name}"] = (
+                None if mean is None else round(mean, self._decimals)
+            )
+        return attributes
+
+    @property
+    def should_poll(self):
+        """The sensor is updated by its source sensors' state changes."""
+        return False
+
+    @profiled
     async def async_update_temp(self, entity, old_state, new_state):
         """Update the sensors internal temperature state"""
         self._temp = convert(new_state)
-        self._update_internal_state()
+        if self._update_internal_state():
+            self.async_schedule_update_ha_state()
 
+    @profiled
     async def async_update_humidity(self, entity, old_state, new_state):
         """Update the sensors internal humidity state"""
         self._humidity = convert(new_state)
-        self._update_internal_state()
+        if self._update_internal_state():
+            self.async_schedule_update_ha_state()
 
+    @timed("feels_like.update")
     def _update_internal_state(self):
-        """Fetch new state data for the sensor."""
+        """Compute the state from the sources, returns False if it can't yet."""
         if self._temp is None or self._humidity is None:
-            return
+            return False
 
         if self._temp < 80.0:
             self._state = self._temp
@@ -125,4 +251,8 @@ class FeelsLikeSensor(Entity):
                 self._decimals,
             )
 
-        self.async_schedule_update_ha_state()
+        if self._windows:
+            timestamp = dt_util.utcnow().timestamp()
+            for window in self._windows.values():
+                window.add(timestamp, self._state)
+        return True
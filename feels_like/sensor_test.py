@@ -0,0 +1,56 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the feels like sensor."""
+
+from unittest import TestCase
+
+from homeassistant.const import (
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    TEMP_CELSIUS,
+    TEMP_FAHRENHEIT,
+)
+from homeassistant.core import State
+
+from .sensor import convert
+
+
+class TestConvert(TestCase):
+    def test_convert(self):
+        self.assertEqual(
+            50.0, convert(State("sensor.humidity", "50", {"unit_of_measurement": "%"}))
+        )
+        self.assertEqual(
+            72.5,
+            convert(
+                State("sensor.temp", "72.5", {"unit_of_measurement": TEMP_FAHRENHEIT})
+            ),
+        )
+        self.assertEqual(
+            212.0,
+            convert(State("sensor.temp", "100", {"unit_of_measurement": TEMP_CELSIUS})),
+        )
+
+    def test_missing_values(self):
+        self.assertIsNone(convert(None))
+        self.assertIsNone(convert(State("sensor.temp", STATE_UNAVAILABLE)))
+        self.assertIsNone(convert(State("sensor.temp", STATE_UNKNOWN)))
+        self.assertIsNone(convert(State("sensor.temp", "warm")))
+
+    def test_unit(self):
+        # without a unit the value is taken as is
+        self.assertEqual(70.0, convert(State("sensor.temp", "70")))
+        self.assertIsNone(
+            convert(State("sensor.temp", "70", {"unit_of_measurement": "lux"}))
+        )
@@ -0,0 +1,167 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Latency histograms and counters shared by the custom components.
+
+Recording is disabled until one of the platforms is configured with
+``diagnostics: true``.  While disabled, instrumented calls cost a single
+attribute check.
+"""
+
+from bisect import bisect_left
+from functools import wraps
+from inspect import iscoroutinefunction
+from time import perf_counter
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket
+# catches everything slower
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """Fixed bucket latency histogram."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, millis):
+        """Record one sample (in milliseconds)."""
+        self.counts[bisect_left(BUCKETS, millis)] += 1
+        self.count += 1
+        self.total += millis
+        if self.min is None or millis < self.min:
+            self.min = millis
+        if self.max is None or millis > self.max:
+            self.max = millis
+
+    def quantile(self, quantile):
+        """Estimate the given quantile as the upper bound of its bucket."""
+        if self.count == 0:
+            return None
+
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index < len(BUCKETS):
+                    return min(BUCKETS[index], self.max)
+                return self.max
+        return self.max
+
+    def as_dict(self):
+        """Summarize the histogram."""
+        if self.count == 0:
+            return {"count": 0}
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3),
+            "min_ms": round(self.min, 3),
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class Stats:
+    """Registry of named histograms and counters."""
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, millis):
+        """Record a latency sample for name."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(millis)
+
+    def increment(self, name, amount=1):
+        """Increment the named counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        """Set the current value of the named gauge."""
+        self.gauges[name] = value
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.histograms.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+    def snapshot(self, prefix=""):
+        """Return the recorded stats whose names start with prefix."""
+        return {
+            "histograms": {
+                name: histogram.as_dict()
+                for name, histogram in sorted(self.histograms.items())
+                if name.startswith(prefix)
+            },
+            "counters": {
+                name: count
+                for name, count in sorted(self.counters.items())
+                if name.startswith(prefix)
+            },
+            "gauges": {
+                name: value
+                for name, value in sorted(self.gauges.items())
+                if name.startswith(prefix)
+            },
+        }
+
+
+STATS = Stats()
+
+
+def timed(name):
+    """Decorate a function or coroutine function to record its latency."""
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not STATS.enabled:
+                    return await func(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    STATS.observe(name, (perf_counter() - start) * 1000)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STATS.observe(name, (perf_counter() - start) * 1000)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,76 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the instrumentation histograms and counters."""
+
+import asyncio
+from unittest import TestCase
+
+from .instrumentation import STATS, Histogram, Stats, timed
+
+
+class TestHistogram(TestCase):
+    def test_quantiles(self):
+        histogram = Histogram()
+        for _ in range(98):
+            histogram.observe(0.3)
+        histogram.observe(20)
+        histogram.observe(20)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.quantile(0.5), 0.5)
+        self.assertEqual(histogram.quantile(0.99), 20)
+        self.assertEqual(histogram.as_dict()["max_ms"], 20)
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().quantile(0.5))
+        self.assertEqual(Histogram().as_dict(), {"count": 0})
+
+
+class TestStats(TestCase):
+    def test_snapshot_prefix(self):
+        stats = Stats()
+        stats.observe("schedule.update", 1)
+        stats.observe("feels_like.update", 1)
+        stats.increment("schedule.renders")
+        stats.increment("schedule.renders")
+
+        snapshot = stats.snapshot("schedule.")
+        self.assertEqual(list(snapshot["histograms"]), ["schedule.update"])
+        self.assertEqual(snapshot["counters"], {"schedule.renders": 2})
+
+
+class TestTimed(TestCase):
+    def setUp(self):
+        STATS.reset()
+
+    def tearDown(self):
+        STATS.enabled = False
+        STATS.reset()
+
+    def test_disabled(self):
+        STATS.enabled = False
+        self.assertEqual(timed("test.sync")(lambda: 1)(), 1)
+        self.assertEqual(STATS.histograms, {})
+
+    def test_enabled(self):
+        STATS.enabled = True
+
+        @timed("test.async")
+        async def coroutine():
+            return 2
+
+        self.assertEqual(timed("test.sync")(lambda: 1)(), 1)
+        self.assertEqual(asyncio.run(coroutine()), 2)
+        self.assertEqual(STATS.histograms["test.sync"].count, 1)
+        self.assertEqual(STATS.histograms["test.async"].count, 1)
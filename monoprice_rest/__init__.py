@@ -1 +1,9 @@
 """The Monoprice 6-Zone Amplifier integration via REST API"""
+
+DATA_HASS_CONFIG = "monoprice_rest_hass_config"
+
+
+async def async_setup(hass, config):
+    """Keep the Home Assistant config, the sensor platform is loaded with it."""
+    hass.data[DATA_HASS_CONFIG] = config
+    return True
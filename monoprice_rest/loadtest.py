@@ -0,0 +1,136 @@
+"""Load test for the Monoprice client against the stub REST server
+
+Drives MonopriceZone entities through polling cycles with bursts of user
+commands and reports request counts, throughput and p50/p99 latency.  Run
+with:
+
+    python -m custom_components.monoprice_rest.loadtest --zones 6 18 36
+"""
+
+import argparse
+import asyncio
+import random
+from time import perf_counter
+
+import aiohttp
+
+from .media_player import Monoprice, MonopriceZone
+from .stub_server import StubServer
+
+SOURCES = {1: "Source 1", 2: "Source 2", 3: "Source 3"}
+
+
+class TimedMonoprice(Monoprice):
+    """Monoprice client recording the latency of every request."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = {"GET": [], "PUT": []}
+
+    async def _request(self, method, url, *args):
+        start = perf_counter()
+        try:
+            return await super()._request(method, url, *args)
+        finally:
+            self.latencies[method].append(perf_counter() - start)
+
+
+def percentile(values, quantile):
+    """Nearest rank percentile of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+async def _command_burst(zones, rng, size):
+    commands = []
+    for zone in rng.sample(zones, min(size, len(zones))):
+        command = rng.choice(
+            [
+                zone.async_turn_on,
+                zone.async_turn_off,
+                zone.async_volume_up,
+                lambda zone=zone: zone.async_select_source(rng.choice(zone.source_list)),
+            ]
+        )
+        commands.append(command())
+    await asyncio.gather(*commands)
+
+
+async def run(zone_count, cycles=5, burst=3, seed=0, **server_args):
+    """Run the load test for zone_count zones and return the results."""
+    server = StubServer(zones=zone_count, seed=seed, **server_args)
+    url = await server.start()
+    rng = random.Random(seed)
+    sources = [SOURCES, {v: k for k, v in SOURCES.items()}, list(SOURCES.values())]
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            monoprice = TimedMonoprice(url, server.api_key, session, False)
+            zones = [
+                MonopriceZone(monoprice, sources, "loadtest", zone_id)
+                for zone_id in await monoprice.zones()
+            ]
+
+            start = perf_counter()
+            for _ in range(cycles):
+                await asyncio.gather(
+                    *[zone.async_update() for zone in zones],
+                    _command_burst(zones, rng, burst),
+                )
+            elapsed = perf_counter() - start
+    finally:
+        await server.stop()
+
+    requests = server.request_count
+    results = {
+        "zones": zone_count,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "by_endpoint": dict(server.requests),
+        "not_modified": monoprice.not_modified,
+    }
+    for method, name in (("GET", "poll"), ("PUT", "command")):
+        latencies = monoprice.latencies[method]
+        for quantile in (0.5, 0.99):
+            value = percentile(latencies, quantile)
+            results[f"{name}_p{int(quantile * 100)}_ms"] = (
+                None if value is None else round(value * 1000, 2)
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zones", type=int, nargs="+", default=[6, 18, 36])
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrent", action="store_true")
+    args = parser.parse_args()
+
+    for zone_count in args.zones:
+        results = asyncio.run(
+            run(
+                zone_count,
+                cycles=args.cycles,
+                burst=args.burst,
+                latency=args.latency,
+                jitter=args.jitter,
+                error_rate=args.error_rate,
+                serial=not args.concurrent,
+            )
+        )
+        print(
+            "{zones:>3} zones: {requests} requests in {elapsed_s}s "
+            "({throughput_rps} req/s, {not_modified} not modified) poll p50/p99 {poll_p50_ms}/{poll_p99_ms} ms "
+            "command p50/p99 {command_p50_ms}/{command_p99_ms} ms".format(**results)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 """Control for monoprice multizone amplifier over a REST interface"""
 
+import asyncio
+from datetime import timedelta
+from heapq import heappop, heappush
+from itertools import count
 import logging
 from ssl import SSLCertVerificationError
+from time import perf_counter
+from aiohttp import hdrs
 from aiohttp.client_exceptions import ClientError
 
 import voluptuous as vol
@@ -21,13 +27,23 @@ from homeassistant.const import (
     CONF_API_KEY,
     CONF_NAME,
     CONF_PORT,
+    CONF_SCAN_INTERVAL,
     CONF_URL,
     STATE_OFF,
     STATE_ON,
 )
-from homeassistant.helpers import aiohttp_client
+from homeassistant.core import callback
+from homeassistant.helpers import aiohttp_client, discovery
 import homeassistant.helpers.config_validation as cv
-from homeassistant.util import ssl
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from ..diagnostics import CONF_DIAGNOSTICS
+from ..instrumentation import STATS
+from ..profiling import async_register_profile_service, profiled
+from ..ssl_context import client_context
+from . import DATA_HASS_CONFIG
 
 DOMAIN = "monoprice_rest"
 SUPPORT_MONOPRICE = (
@@ -41,7 +57,28 @@ SUPPORT_MONOPRICE = (
 
 _LOGGER = logging.getLogger(__name__)
 
+SCAN_INTERVAL = timedelta(seconds=10)
+# how often the client SSL context is fetched again, to pick up a new CA file
+CONTEXT_REFRESH_INTERVAL = timedelta(minutes=1)
+
+DATA_ZONE_CACHE = f"{DOMAIN}_zone_cache"
+STORAGE_KEY = f"{DOMAIN}.zones"
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 60
+
 CONF_SOURCES = "sources"
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+CONF_ZONES = "zones"
+
+# the REST server on the amp handles one request at a time
+DEFAULT_MAX_IN_FLIGHT = 1
+
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+PRIORITY_NAMES = {PRIORITY_COMMAND: "command", PRIORITY_POLL: "poll"}
+
+# returned by Monoprice.get when the server answers 304 Not Modified
+NOT_MODIFIED = object()
 
 SOURCE_IDS = vol.All(vol.Coerce(int), vol.Range(min=1, max=6))
 
@@ -53,6 +90,11 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
         vol.Required(CONF_URL): str,
         vol.Required(CONF_API_KEY): str,
         vol.Required(CONF_SOURCES): vol.Schema({SOURCE_IDS: SOURCE_SCHEMA}),
+        vol.Optional(CONF_ZONES): vol.All(cv.ensure_list, [vol.Coerce(int)]),
+        vol.Optional(
+            CONF_MAX_IN_FLIGHT, default=DEFAULT_MAX_IN_FLIGHT
+        ): cv.positive_int,
+        vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean,
     }
 )
 
@@ -60,7 +102,14 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the media player platform."""
     _LOGGER.debug("Setting up monoprice_rest")
-    zones = []
+    if config.get(CONF_DIAGNOSTICS):
+        # diagnostic sensors live in this integration's sensor platform
+        hass.async_create_task(
+            discovery.async_load_platform(
+                hass, "sensor", DOMAIN, {}, hass.data[DATA_HASS_CONFIG]
+            )
+        )
+    async_register_profile_service(hass, DOMAIN)
 
     source_id_name = {
         int(index): value["name"] for index, value in config[CONF_SOURCES].items()
@@ -70,46 +119,229 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     source_names = sorted(source_name_id.keys(), key=lambda v: source_name_id[v])
     sources = [source_id_name, source_name_id, source_names]
 
-    session = aiohttp_client.async_get_clientsession(hass)
-
-    monoprice = Monoprice(config.get(CONF_URL), config.get(CONF_API_KEY), session)
+    coordinator = await async_get_coordinator(hass, config)
 
-    zones = await monoprice.zones()
-    if zones:
+    @callback
+    def async_add_zones(zones):
         entities = []
         for zone in zones:
             _LOGGER.debug(f"Setting up zone {zone}")
-            entities.append(MonopriceZone(monoprice, sources, "monoprice_rest", zone))
+            entities.append(
+                MonopriceZone(
+                    coordinator.monoprice, sources, "monoprice_rest", zone, coordinator
+                )
+            )
         async_add_entities(entities)
+
+    if await coordinator.async_zones():
+        coordinator.async_add_entry(config.get(CONF_ZONES), async_add_zones)
     else:
-        _LOGGER.warn("Failed to retrieve zones from server")
+        _LOGGER.warning("Failed to retrieve zones from server")
+
+
+async def async_get_coordinator(hass, config):
+    """Get the poll coordinator (and client) for the configured server.
+
+    Platform entries that point at the same server and API key share one
+    client and one coordinator, the first entry's settings are used.
+    """
+    coordinators = hass.data.setdefault(DOMAIN, {})
+    key = (config[CONF_URL], config[CONF_API_KEY])
+    if key not in coordinators:
+        session = aiohttp_client.async_get_clientsession(hass)
+        # building the context loads CA files from disk, keep it off the event loop
+        context = await hass.async_add_executor_job(client_context)
+        if key not in coordinators:
+            monoprice = Monoprice(
+                config[CONF_URL],
+                config[CONF_API_KEY],
+                session,
+                context,
+                config.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT),
+            )
+            coordinators[key] = MonopriceCoordinator(
+                hass,
+                monoprice,
+                config.get(CONF_SCAN_INTERVAL, SCAN_INTERVAL),
+                _get_zone_cache(hass),
+            )
+    return coordinators[key]
+
+
+def _get_zone_cache(hass):
+    """Get the zone cache shared by all servers."""
+    if DATA_ZONE_CACHE not in hass.data:
+        hass.data[DATA_ZONE_CACHE] = ZoneCache(hass)
+    return hass.data[DATA_ZONE_CACHE]
+
+
+class ZoneCache:
+    """Discovered zones and their last status, persisted per server url."""
+
+    def __init__(self, hass):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data = None
+        self._lock = asyncio.Lock()
+
+    async def async_get(self, url):
+        """Return (zones, statuses) last stored for url, or None."""
+        async with self._lock:
+            if self._data is None:
+                self._data = await self._store.async_load() or {}
+
+        server = self._data.get(url)
+        if not server or not server.get("zones"):
+            return None
+        statuses = {int(zone): status for zone, status in server["statuses"].items()}
+        return server["zones"], statuses
+
+    @callback
+    def async_set(self, url, zones, statuses):
+        """Store the zones and statuses for url (written out after a delay)."""
+        if self._data is None:
+            self._data = {}
+        self._data[url] = {
+            "zones": list(zones),
+            "statuses": {str(zone): status for zone, status in statuses.items()},
+        }
+        self._store.async_delay_save(lambda: self._data, STORAGE_SAVE_DELAY)
+
+
+def _endpoint(url):
+    """Reduce a request url to its endpoint, e.g. 11/volume/20 -> {zone}/volume."""
+    parts = url.split("/")
+    if parts[0].isdigit():
+        parts[0] = "{zone}"
+    return "/".join(parts[:2])
+
+
+class RequestScheduler:
+    """Limit the requests in flight, handing free slots out by priority.
+
+    Lower priority values go first, requests with the same priority are
+    served in the order they arrived.
+    """
+
+    def __init__(self, limit=DEFAULT_MAX_IN_FLIGHT):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = count()
+
+    @property
+    def depth(self):
+        """Number of requests waiting for a slot."""
+        return sum(1 for waiter in self._waiters if not waiter[2].done())
+
+    async def acquire(self, priority):
+        """Wait for a free slot, returns the time spent waiting (seconds)."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return 0.0
+
+        start = perf_counter()
+        future = asyncio.get_event_loop().create_future()
+        heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            raise
+        return perf_counter() - start
+
+    def release(self):
+        """Free a slot, handing it to the next waiter if there is one."""
+        while self._waiters:
+            future = heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
 
 
 class Monoprice:
-    def __init__(self, url, apiKey, session):
+    def __init__(
+        self,
+        url,
+        apiKey,
+        session,
+        context=None,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+    ):
         self._url = url
         self._api_key = apiKey
         self._session = session
-        self._context = ssl.client_context()
+        if context is None:
+            context = client_context()
+        # the shared client context, or False to skip verification
+        self.context = context
+        self.scheduler = RequestScheduler(max_in_flight)
+        # url -> conditional request headers from the last response
+        self._validators = {}
+        # url -> body of the last successful response
+        self._bodies = {}
+        self.not_modified = 0
+
+    @property
+    def url(self):
+        """Base url of the REST server."""
+        return self._url
+
+    @profiled
+    async def _request(self, method, url, priority=PRIORITY_POLL):
+        if self._session.closed:
+            return None
 
-    async def _request(self, method, url):
+        if STATS.enabled:
+            STATS.gauge(f"{DOMAIN}.queue_depth", self.scheduler.depth)
+        waited = await self.scheduler.acquire(priority)
+        if STATS.enabled:
+            STATS.observe(
+                f"{DOMAIN}.queue_wait.{PRIORITY_NAMES[priority]}", waited * 1000
+            )
+        try:
+            return await self._send(method, url)
+        finally:
+            self.scheduler.release()
+
+    async def _send(self, method, url):
+        endpoint = url
         url = f"{self._url}/{url}"
         if self._session.closed:
             return None
 
+        headers = {"X-Auth-Key": f"{self._api_key}"}
+        if method == "GET":
+            headers.update(self._validators.get(url, {}))
+
+        status = "error"
+        start = perf_counter() if STATS.enabled else None
+        # anything but a 200 or 304 leaves the last known body in doubt
+        valid = False
         try:
             response = await self._session.request(
-                method,
-                url,
-                ssl=self._context,
-                headers={"X-Auth-Key": f"{self._api_key}"},
+                method, url, ssl=self.context, headers=headers,
             )
+            status = response.status
+
+            if response.status == 304:
+                valid = True
+                self.not_modified += 1
+                if STATS.enabled:
+                    STATS.increment(f"{DOMAIN}.not_modified")
+                return NOT_MODIFIED
 
             if response.status == 200:
                 if response.content_type == "application/json":
-                    return await response.json()
+                    body = await response.json()
                 else:
-                    return await response.text()
+                    body = await response.text()
+                valid = True
+                if method == "GET":
+                    self._remember(url, response, body)
+                return body
 
             elif response.status == 401:
                 _LOGGER.warning("Authentication failed, check API KEY")
@@ -129,25 +361,192 @@ class Monoprice:
         except Exception as ex:
             _LOGGER.warning("%s Request %s failed: %s", method, url, ex)
             raise ex
+        finally:
+            if not valid:
+                self._forget(url)
+            if start is not None:
+                name = f"{DOMAIN}.request.{method}.{_endpoint(endpoint)}"
+                STATS.observe(name, (perf_counter() - start) * 1000)
+                STATS.increment(f"{name}.{status}")
+
+    def _remember(self, url, response, body):
+        """Keep the body and ETag/Last-Modified of a response for the next request."""
+        validators = {}
+        if hdrs.ETAG in response.headers:
+            validators[hdrs.IF_NONE_MATCH] = response.headers[hdrs.ETAG]
+        if hdrs.LAST_MODIFIED in response.headers:
+            validators[hdrs.IF_MODIFIED_SINCE] = response.headers[hdrs.LAST_MODIFIED]
+
+        if validators:
+            self._validators[url] = validators
+            self._bodies[url] = body
+        else:
+            self._forget(url)
 
-    async def get(self, url):
-        return await self._request("GET", url)
+    def _forget(self, url):
+        """Stop sending conditional requests for url."""
+        self._validators.pop(url, None)
+        self._bodies.pop(url, None)
 
-    async def put(self, url):
-        return await self._request("PUT", url)
+    def cached(self, url):
+        """Return the body of the last conditional GET response for url."""
+        return self._bodies.get(f"{self._url}/{url}")
+
+    async def get(self, url, priority=PRIORITY_POLL):
+        return await self._request("GET", url, priority)
+
+    async def put(self, url, priority=PRIORITY_COMMAND):
+        return await self._request("PUT", url, priority)
 
     async def zones(self):
-        zones = await self.get("zones")
+        zones = await self.get("zones", PRIORITY_COMMAND)
         _LOGGER.debug(f"Got zones {zones}")
         return zones
 
 
+class MonopriceCoordinator(DataUpdateCoordinator):
+    """Polls the status of every zone in use on one server."""
+
+    def __init__(self, hass, monoprice, update_interval, cache):
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {monoprice.url}",
+            update_interval=update_interval,
+        )
+        self.monoprice = monoprice
+        # zone id -> entities using it
+        self.zones = {}
+        # zone id -> last known status
+        self.statuses = {}
+        self._cache = cache
+        self._entries = []
+        self._discovered = None
+        self._discover_lock = asyncio.Lock()
+        self._context_refreshed = dt_util.utcnow()
+
+    async def async_zones(self):
+        """Get the server's zones, discovered once for all platform entries.
+
+        Zones persisted by an earlier run are returned straight away (with
+        their last status) and rediscovered in the background.
+        """
+        async with self._discover_lock:
+            if self._discovered:
+                return self._discovered
+
+            cached = await self._cache.async_get(self.monoprice.url)
+            if cached:
+                self._discovered, self.statuses = cached
+                self.hass.async_create_task(self._async_rediscover())
+            else:
+                zones = await self.monoprice.zones()
+                if zones is None:
+                    # left undiscovered, the next platform entry tries again
+                    return None
+                self._discovered = zones
+                self._async_save()
+        return self._discovered
+
+    async def _async_rediscover(self):
+        """Discover the zones again, adding and removing only what changed."""
+        zones = await self.monoprice.zones()
+        if not zones:
+            return
+
+        added = [zone for zone in zones if zone not in self._discovered]
+        removed = [zone for zone in self._discovered if zone not in zones]
+        self._discovered = zones
+        if added:
+            _LOGGER.debug("Discovered new zones %s", added)
+            for zone_filter, async_add_zones in self._entries:
+                async_add_zones(self._filter(added, zone_filter))
+        for zone in removed:
+            _LOGGER.debug("Zone %s is gone", zone)
+            self.statuses.pop(zone, None)
+            for entity in list(self.zones.get(zone, [])):
+                self.hass.async_create_task(entity.async_remove())
+        if added or removed:
+            self._async_save()
+
+    @staticmethod
+    def _filter(zones, zone_filter):
+        if not zone_filter:
+            return zones
+        return [zone for zone in zones if zone in zone_filter]
+
+    @callback
+    def async_add_entry(self, zone_filter, async_add_zones):
+        """Create the entities of a platform entry, now and for new zones."""
+        self._entries.append((zone_filter, async_add_zones))
+        async_add_zones(self._filter(self._discovered, zone_filter))
+
+    @callback
+    def _async_save(self):
+        self._cache.async_set(self.monoprice.url, self._discovered, self.statuses)
+
+    @callback
+    def async_add_zone(self, entity):
+        """Poll the entity's zone and update the entity after every refresh."""
+        zone_id = entity.zone_id
+        self.zones.setdefault(zone_id, []).append(entity)
+        remove_listener = self.async_add_listener(entity.handle_coordinator_update)
+
+        @callback
+        def remove_zone():
+            remove_listener()
+            self.zones[zone_id].remove(entity)
+            if not self.zones[zone_id]:
+                del self.zones[zone_id]
+
+        return remove_zone
+
+    @callback
+    def async_set_status(self, zone_id, status):
+        """Remember the latest status of a zone."""
+        if isinstance(status, dict) and status != self.statuses.get(zone_id):
+            self.statuses[zone_id] = status
+            self._async_save()
+
+    async def _async_refresh_context(self):
+        """Fetch the client SSL context again every CONTEXT_REFRESH_INTERVAL.
+
+        client_context returns the same context until the CA file
+        changes, checking the file blocks so it goes through the executor.
+        """
+        if self.monoprice.context is False:
+            return
+        now = dt_util.utcnow()
+        if now - self._context_refreshed < CONTEXT_REFRESH_INTERVAL:
+            return
+        self._context_refreshed = now
+        self.monoprice.context = await self.hass.async_add_executor_job(
+            client_context
+        )
+
+    @profiled
+    async def _async_update_data(self):
+        """Fetch the status of all zones in use."""
+        await self._async_refresh_context()
+        zone_ids = list(self.zones)
+        statuses = await asyncio.gather(
+            *[self.monoprice.get(f"{zone_id}/status") for zone_id in zone_ids]
+        )
+        for zone_id, status in zip(zone_ids, statuses):
+            self.async_set_status(zone_id, status)
+        return dict(zip(zone_ids, statuses))
+
+
 class MonopriceZone(MediaPlayerEntity):
     """Representation of a Monoprice amplifier zone."""
 
-    def __init__(self, monoprice, sources, namespace, zone_id):
-        """Initialize new zone."""
+    def __init__(self, monoprice, sources, namespace, zone_id, coordinator=None):
+        """Initialize new zone.
+
+        Without a coordinator the zone is polled on its own.
+        """
         self._monoprice = monoprice
+        self._coordinator = coordinator
         # dict source_id -> source name
         self._source_id_name = sources[0]
         # dict source name -> source_id
@@ -165,14 +564,70 @@ class MonopriceZone(MediaPlayerEntity):
         self._mute = None
         self._update_success = True
 
+    async def async_added_to_hass(self):
+        """Register with the coordinator."""
+        if self._coordinator is None:
+            return
+
+        self.async_on_remove(self._coordinator.async_add_zone(self))
+        # start out with the last known status, the coordinator's first
+        # refresh is a whole interval away so fetch the current one now
+        if self._zone_id in self._coordinator.statuses:
+            self._apply(self._coordinator.statuses[self._zone_id])
+        self.hass.async_create_task(self._async_refresh(PRIORITY_POLL))
+
+    @property
+    def zone_id(self):
+        """Return the zone's id on the amplifier."""
+        return self._zone_id
+
+    @callback
+    @profiled
+    def handle_coordinator_update(self):
+        """Apply the status from the last refresh, writing state only on change."""
+        data = self._coordinator.data or {}
+        if self._zone_id in data and self._apply(data[self._zone_id]):
+            self.async_write_ha_state()
+
+    @property
+    def should_poll(self):
+        """Zones using a coordinator are refreshed by it."""
+        return self._coordinator is None
+
+    @profiled
     async def async_update(self):
         """Retrieve latest state."""
-        status = None
-        state = await self._monoprice.get(f"{self._zone_id}/status")
+        self._apply(await self._monoprice.get(f"{self._zone_id}/status"))
+
+    async def _async_refresh_after_command(self):
+        """Fetch this zone's status straight after a command."""
+        if self._coordinator is not None:
+            await self._async_refresh(PRIORITY_COMMAND)
+
+    async def _async_refresh(self, priority):
+        """Fetch this zone's status outside of the coordinator's refreshes."""
+        url = f"{self._zone_id}/status"
+        state = await self._monoprice.get(url, priority)
+        if state is NOT_MODIFIED and self._state is None:
+            state = self._monoprice.cached(url)
+        self._coordinator.async_set_status(self._zone_id, state)
+        if self._apply(state):
+            self.async_write_ha_state()
+
+    def _apply(self, state):
+        """Update the zone from a status response, returns True if it changed."""
+        if state is NOT_MODIFIED:
+            if self._state is not None:
+                # same status as the last poll, nothing to decode or assign
+                return False
+            # polled by another entity or an earlier coordinator refresh
+            state = self._monoprice.cached(f"{self._zone_id}/status")
+
+        before = (self._state, self._volume, self._mute, self._source)
         if not state:
             self._state = None
             self._update_success = False
-            return
+            return before[0] is not None
 
         self._state = STATE_ON if state["power"] else STATE_OFF
         self._volume = state["volume"]
@@ -182,6 +637,7 @@ class MonopriceZone(MediaPlayerEntity):
             self._source = self._source_id_name[idx]
         else:
             self._source = None
+        return before != (self._state, self._volume, self._mute, self._source)
 
     @property
     def entity_registry_enabled_default(self):
@@ -272,31 +728,38 @@ class MonopriceZone(MediaPlayerEntity):
             return
         idx = self._source_name_id[source]
         await self._monoprice.put(f"{self._zone_id}/source/{idx}")
+        await self._async_refresh_after_command()
 
     async def async_turn_on(self):
         """Turn the media player on."""
         await self._monoprice.put(f"{self._zone_id}/power/True")
+        await self._async_refresh_after_command()
 
     async def async_turn_off(self):
         """Turn the media player off."""
         await self._monoprice.put(f"{self._zone_id}/power/False")
+        await self._async_refresh_after_command()
 
     async def async_mute_volume(self, mute):
         """Mute (true) or unmute (false) media player."""
         await self._monoprice.put(f"{self._zone_id}/mute/{mute}")
+        await self._async_refresh_after_command()
 
     async def async_set_volume_level(self, volume):
         """Set volume level, range 0..1."""
         await self._monoprice.put(f"{self._zone_id}/volume/{int(volume * 38)}")
+        await self._async_refresh_after_command()
 
     async def async_volume_up(self):
         """Volume up the media player."""
         if self._volume is None:
             return
         await self._monoprice.put(f"{self._zone_id}/volume/{min(self._volume + 1, 38)}")
+        await self._async_refresh_after_command()
 
     async def async_volume_down(self):
         """Volume down media player."""
         if self._volume is None:
             return
         await self._monoprice.put(f"{self._zone_id}/volume/{max(self._volume - 1, 0)}")
+        await self._async_refresh_after_command()
@@ -0,0 +1,302 @@
+"""Test the Monoprice client against the stub REST server"""
+
+import asyncio
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiohttp
+
+from homeassistant.const import CONF_API_KEY, CONF_URL, STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import discovery
+from homeassistant.util import dt as dt_util
+
+from ..diagnostics import CONF_DIAGNOSTICS
+from ..ssl_context import client_context
+from . import async_setup
+from .loadtest import run
+from .media_player import (
+    CONF_SOURCES,
+    CONF_ZONES,
+    CONTEXT_REFRESH_INTERVAL,
+    PLATFORM_SCHEMA,
+    PRIORITY_COMMAND,
+    PRIORITY_POLL,
+    Monoprice,
+    MonopriceZone,
+    RequestScheduler,
+    async_get_coordinator,
+    async_setup_platform,
+)
+from .stub_server import StubServer
+
+SOURCES = {1: "Radio", 2: "TV"}
+
+
+class StubServerTestCase(IsolatedAsyncioTestCase):
+    server_args = {}
+
+    async def asyncSetUp(self):
+        self.server = StubServer(**self.server_args)
+        url = await self.server.start()
+        self.session = aiohttp.ClientSession()
+        self.monoprice = Monoprice(url, self.server.api_key, self.session, False)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.stop()
+
+    def zone(self, zone_id):
+        sources = [SOURCES, {v: k for k, v in SOURCES.items()}, list(SOURCES.values())]
+        return MonopriceZone(self.monoprice, sources, "test", zone_id)
+
+
+class TestMonoprice(StubServerTestCase):
+    async def test_zones(self):
+        self.assertEqual(await self.monoprice.zones(), [11, 12, 13, 14, 15, 16])
+
+    async def test_commands(self):
+        zone = self.zone(12)
+        await zone.async_update()
+        self.assertEqual(zone.state, STATE_OFF)
+        self.assertEqual(zone.source, "Radio")
+
+        await zone.async_turn_on()
+        await zone.async_select_source("TV")
+        await zone.async_set_volume_level(0.5)
+        await zone.async_update()
+        self.assertEqual(zone.state, STATE_ON)
+        self.assertEqual(zone.source, "TV")
+        self.assertEqual(zone.volume_level, 19 / 38.0)
+        self.assertEqual(self.server.requests["PUT /{zone}/{command}/{value}"], 3)
+
+    async def test_not_modified(self):
+        zone = self.zone(13)
+        await zone.async_update()
+        self.assertEqual(self.monoprice.not_modified, 0)
+
+        await zone.async_update()
+        self.assertEqual(self.monoprice.not_modified, 1)
+        self.assertEqual(zone.state, STATE_OFF)
+
+        await zone.async_turn_on()
+        await zone.async_update()
+        self.assertEqual(self.monoprice.not_modified, 1)
+        self.assertEqual(zone.state, STATE_ON)
+
+    async def test_recover_after_error(self):
+        zone = self.zone(14)
+        await zone.async_update()
+        self.assertEqual(zone.state, STATE_OFF)
+
+        self.server.error_rate = 1.0
+        await zone.async_update()
+        self.assertIsNone(zone.state)
+
+        # the failed poll dropped the ETag, the zone gets its full status back
+        self.server.error_rate = 0.0
+        await zone.async_update()
+        self.assertEqual(zone.state, STATE_OFF)
+        self.assertEqual(self.monoprice.not_modified, 0)
+
+    async def test_not_modified_without_state(self):
+        polled, zone = self.zone(15), self.zone(15)
+        await polled.async_update()
+        # another entity polled the zone, its status comes from the cache
+        await zone.async_update()
+        self.assertEqual(self.monoprice.not_modified, 1)
+        self.assertEqual(zone.state, STATE_OFF)
+
+
+class TestMonopriceAuthFailure(StubServerTestCase):
+    server_args = {"auth_failure_rate": 1.0}
+
+    async def test_update_fails(self):
+        zone = self.zone(11)
+        await zone.async_update()
+        self.assertIsNone(zone.state)
+        self.assertIsNone(await self.monoprice.zones())
+
+
+class TestSharedClient(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StubServer()
+        url = await self.server.start()
+        self.config_dir = TemporaryDirectory()
+        self.hass = self.new_hass()
+        self.config = {
+            "platform": "monoprice_rest",
+            "name": "Monoprice",
+            CONF_URL: url,
+            CONF_API_KEY: self.server.api_key,
+            CONF_SOURCES: {1: {"name": "Radio"}},
+        }
+
+    async def asyncTearDown(self):
+        await self.hass.async_stop(force=True)
+        await self.server.stop()
+        self.config_dir.cleanup()
+
+    def new_hass(self):
+        hass = HomeAssistant()
+        hass.config.config_dir = self.config_dir.name
+        return hass
+
+    async def setup_entry(self, zones=None, wait=True):
+        entities = []
+
+        def add_entities(new_entities):
+            for entity in new_entities:
+                entity.hass = self.hass
+                entity.entity_id = f"media_player.zone_{entity.unique_id}"
+                entity.async_write_ha_state = MagicMock()
+                entity.async_remove = AsyncMock()
+            entities.extend(new_entities)
+
+        config = PLATFORM_SCHEMA({**self.config, CONF_ZONES: zones or []})
+        await async_setup_platform(self.hass, config, add_entities)
+        for entity in list(entities):
+            await entity.async_added_to_hass()
+        if wait:
+            await self.hass.async_block_till_done()
+        return entities
+
+    async def test_shared_coordinator(self):
+        upstairs = await self.setup_entry([11, 12])
+        downstairs = await self.setup_entry([13])
+        coordinator = await async_get_coordinator(self.hass, self.config)
+        self.assertIs(upstairs[0]._monoprice, downstairs[0]._monoprice)
+        self.assertEqual(sorted(coordinator.zones), [11, 12, 13])
+        self.assertEqual(self.server.requests["GET /zones"], 1)
+        self.assertEqual(downstairs[0].state, STATE_OFF)
+
+        await coordinator.async_refresh()
+        self.assertEqual(self.server.requests["GET /{zone}/status"], 6)
+        self.assertEqual(coordinator.monoprice.not_modified, 3)
+        for entity in upstairs + downstairs:
+            # only the initial state was written
+            self.assertEqual(entity.async_write_ha_state.call_count, 1)
+
+        self.server.zones[12]["power"] = True
+        await coordinator.async_refresh()
+        self.assertEqual(upstairs[1].state, STATE_ON)
+        self.assertEqual(upstairs[1].async_write_ha_state.call_count, 2)
+        self.assertEqual(upstairs[0].async_write_ha_state.call_count, 1)
+
+    async def test_context_refresh(self):
+        await self.setup_entry([11])
+        coordinator = await async_get_coordinator(self.hass, self.config)
+        context = coordinator.monoprice.context
+        self.assertIs(context, client_context())
+
+        # e.g. a new CA file
+        client_context.invalidate()
+        await coordinator.async_refresh()
+        self.assertIs(coordinator.monoprice.context, context)
+
+        later = dt_util.utcnow() + CONTEXT_REFRESH_INTERVAL
+        with patch.object(dt_util, "utcnow", return_value=later):
+            await coordinator.async_refresh()
+        self.assertIsNot(coordinator.monoprice.context, context)
+        self.assertIs(coordinator.monoprice.context, client_context())
+
+    async def test_discovery_fails(self):
+        self.server.auth_failure_rate = 1.0
+        with self.assertLogs(level="WARNING") as logs:
+            entities = await self.setup_entry()
+        self.assertEqual(entities, [])
+        self.assertIn("Failed to retrieve zones from server", "\n".join(logs.output))
+
+        # a later platform entry tries again
+        self.server.auth_failure_rate = 0.0
+        entities = await self.setup_entry()
+        self.assertEqual(len(entities), 6)
+
+    async def test_diagnostics_platform(self):
+        hass_config = {"sensor": [{"platform": "template"}]}
+        await async_setup(self.hass, hass_config)
+        self.config[CONF_DIAGNOSTICS] = True
+        with patch.object(
+            discovery, "async_load_platform", AsyncMock()
+        ) as async_load_platform:
+            await self.setup_entry([11])
+        async_load_platform.assert_called_once_with(
+            self.hass, "sensor", "monoprice_rest", {}, hass_config
+        )
+
+    async def test_persisted_zones(self):
+        self.server.zones[11]["power"] = True
+        await self.setup_entry()
+        await self.hass.async_stop(force=True)
+
+        # restart with a zone swapped out on the server
+        self.server.zones[21] = {**self.server.zones.pop(16), "zone": 21}
+        self.server.requests.clear()
+        self.hass = self.new_hass()
+        entities = await self.setup_entry(wait=False)
+
+        # the entities start out from the persisted zones and statuses
+        self.assertEqual(self.server.requests, {})
+        zones = {entity.zone_id: entity for entity in entities}
+        self.assertEqual(sorted(zones), [11, 12, 13, 14, 15, 16])
+        self.assertEqual(zones[11].state, STATE_ON)
+
+        await self.hass.async_block_till_done()
+        zones = {entity.zone_id: entity for entity in entities}
+        self.assertEqual(sorted(zones), [11, 12, 13, 14, 15, 16, 21])
+        self.assertEqual(self.server.requests["GET /zones"], 1)
+        zones[16].async_remove.assert_called_once()
+        zones[11].async_remove.assert_not_called()
+
+
+class TestRequestScheduler(IsolatedAsyncioTestCase):
+    async def test_priority(self):
+        scheduler = RequestScheduler(1)
+        order = []
+
+        async def request(name, priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+            await asyncio.sleep(0)
+            scheduler.release()
+
+        await scheduler.acquire(PRIORITY_POLL)
+        tasks = [
+            asyncio.ensure_future(request(name, priority))
+            for name, priority in [
+                ("poll 1", PRIORITY_POLL),
+                ("poll 2", PRIORITY_POLL),
+                ("command", PRIORITY_COMMAND),
+            ]
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.depth, 3)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order, ["command", "poll 1", "poll 2"])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_cancelled_waiter(self):
+        scheduler = RequestScheduler(1)
+        await scheduler.acquire(PRIORITY_POLL)
+        waiter = asyncio.ensure_future(scheduler.acquire(PRIORITY_POLL))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release()
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+class TestLoadTest(IsolatedAsyncioTestCase):
+    async def test_run(self):
+        results = await run(18, cycles=2, burst=2)
+        self.assertEqual(results["zones"], 18)
+        self.assertEqual(results["by_endpoint"]["GET /zones"], 1)
+        self.assertEqual(results["by_endpoint"]["GET /{zone}/status"], 2 * 18)
+        self.assertIsNotNone(results["poll_p99_ms"])
+
+    async def test_commands_skip_polls(self):
+        results = await run(18, cycles=2, burst=2, latency=0.005)
+        self.assertLess(results["command_p99_ms"], results["poll_p99_ms"])
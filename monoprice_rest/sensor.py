@@ -0,0 +1,12 @@
+"""Diagnostic sensors for the Monoprice REST integration"""
+
+from ..diagnostics import async_setup_diagnostics
+from .media_player import DOMAIN
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the diagnostic sensor platform."""
+    if discovery_info is None:
+        return
+
+    await async_setup_diagnostics(hass, DOMAIN, async_add_entities)
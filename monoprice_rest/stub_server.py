@@ -0,0 +1,200 @@
+"""Stub of the Monoprice REST server for testing without an amplifier
+
+Run standalone with:
+
+    python -m custom_components.monoprice_rest.stub_server --zones 18 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import random
+
+from aiohttp import hdrs, web
+
+DEFAULT_API_KEY = "stub-api-key"
+
+# values accepted by the PUT command endpoints and the type they are stored as
+COMMANDS = {
+    "power": lambda v: v == "True",
+    "mute": lambda v: v == "True",
+    "volume": lambda v: max(0, min(38, int(v))),
+    "source": lambda v: max(1, min(6, int(v))),
+    "treble": lambda v: max(0, min(14, int(v))),
+    "bass": lambda v: max(0, min(14, int(v))),
+    "balance": lambda v: max(0, min(20, int(v))),
+}
+
+
+def zone_ids(count):
+    """Return the ids for count zones, numbered like the amp (11-16, 21-26, ...)."""
+    return [amp * 10 + zone for amp in range(1, 100) for zone in range(1, 7)][:count]
+
+
+def status_etag(zone):
+    """Return the ETag of a zone's status."""
+    return '"{:x}"'.format(hash(tuple(sorted(zone.items()))) & 0xFFFFFFFFFFFF)
+
+
+class StubServer:
+    """aiohttp application emulating the amp's REST server.
+
+    latency is the base delay of every request (seconds) with up to jitter
+    added at random.  error_rate and auth_failure_rate are the fractions of
+    requests answered with 500 and 401.  When serial is set, requests are
+    processed one at a time like the single threaded server on the amp.
+    When etags is set, zone status responses carry an ETag and conditional
+    requests for an unchanged zone are answered with 304 Not Modified.
+    """
+
+    def __init__(
+        self,
+        zones=6,
+        api_key=DEFAULT_API_KEY,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        auth_failure_rate=0.0,
+        serial=True,
+        etags=True,
+        seed=None,
+    ):
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.auth_failure_rate = auth_failure_rate
+        self.serial = serial
+        self.etags = etags
+        self.requests = {}
+        self.zones = {
+            zone_id: {
+                "zone": zone_id,
+                "power": False,
+                "mute": False,
+                "volume": 10,
+                "source": 1,
+                "treble": 7,
+                "bass": 7,
+                "balance": 10,
+            }
+            for zone_id in zone_ids(zones)
+        }
+        self._random = random.Random(seed)
+        self._lock = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/zones", self._get_zones)
+        self.app.router.add_get("/{zone}/status", self._get_status)
+        self.app.router.add_put("/{zone}/{command}/{value}", self._put_command)
+        self._runner = None
+        self.url = None
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        route = request.match_info.route.resource
+        endpoint = f"{request.method} {route.canonical if route else request.path}"
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+        if self.serial:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                return await self._handle(request, handler)
+        return await self._handle(request, handler)
+
+    async def _handle(self, request, handler):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if request.headers.get("X-Auth-Key") != self.api_key or (
+            self._random.random() < self.auth_failure_rate
+        ):
+            return web.Response(status=401, text="unauthorized")
+
+        if self._random.random() < self.error_rate:
+            return web.Response(status=500, text="internal error")
+
+        return await handler(request)
+
+    def _zone(self, request):
+        try:
+            return self.zones[int(request.match_info["zone"])]
+        except (KeyError, ValueError):
+            raise web.HTTPNotFound()
+
+    async def _get_zones(self, request):
+        return web.json_response(list(self.zones))
+
+    async def _get_status(self, request):
+        zone = self._zone(request)
+        etag = status_etag(zone)
+        if self.etags:
+            if request.headers.get(hdrs.IF_NONE_MATCH) == etag:
+                return web.Response(status=304, headers={hdrs.ETAG: etag})
+            return web.json_response(zone, headers={hdrs.ETAG: etag})
+        return web.json_response(zone)
+
+    async def _put_command(self, request):
+        zone = self._zone(request)
+        command = request.match_info["command"]
+        if command not in COMMANDS:
+            raise web.HTTPNotFound()
+
+        try:
+            zone[command] = COMMANDS[command](request.match_info["value"])
+        except ValueError:
+            raise web.HTTPBadRequest()
+        return web.json_response(zone)
+
+    @property
+    def request_count(self):
+        """Total number of requests received."""
+        return sum(self.requests.values())
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving, port 0 picks a free port."""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # pylint: disable=protected-access
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--zones", type=int, default=6)
+    parser.add_argument("--api-key", default=DEFAULT_API_KEY)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--auth-failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrent", action="store_true")
+    parser.add_argument("--no-etags", action="store_true")
+    args = parser.parse_args()
+
+    server = StubServer(
+        zones=args.zones,
+        api_key=args.api_key,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        auth_failure_rate=args.auth_failure_rate,
+        serial=not args.concurrent,
+        etags=not args.no_etags,
+    )
+    web.run_app(server.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
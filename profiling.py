@@ -0,0 +1,173 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On-demand profiling of the custom components' callbacks.
+
+Functions decorated with ``profiled`` are only run under the profiler
+while a session started by the ``<domain>.profile`` service is active, the
+rest of the event loop is left out.  Coroutines are profiled one step at a
+time, so time spent in other tasks while they are suspended is not
+attributed to them.
+"""
+
+import cProfile
+from functools import wraps
+from inspect import iscoroutinefunction
+import logging
+
+import voluptuous as vol
+
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_PROFILE = "profile"
+CONF_DURATION = "duration"
+DEFAULT_DURATION = 60
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_DURATION, default=DEFAULT_DURATION): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        )
+    }
+)
+
+
+class ProfileSession:
+    """A cProfile profiler that can be entered by nested callbacks."""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self._depth = 0
+
+    def enable(self):
+        """Start profiling, unless a callback is already being profiled."""
+        if not self._depth:
+            self.profiler.enable()
+        self._depth += 1
+
+    def disable(self):
+        """Stop profiling once the outermost callback is done."""
+        self._depth -= 1
+        if not self._depth:
+            self.profiler.disable()
+
+    def dump(self, path):
+        """Write the collected stats in pstats format."""
+        self.profiler.dump_stats(path)
+
+
+_SESSION = None
+
+
+def start():
+    """Start a profiling session, returns None if one is already running."""
+    global _SESSION  # pylint: disable=global-statement
+    if _SESSION is not None:
+        return None
+    _SESSION = ProfileSession()
+    return _SESSION
+
+
+def stop():
+    """Stop the current profiling session and return it."""
+    global _SESSION  # pylint: disable=global-statement
+    session, _SESSION = _SESSION, None
+    return session
+
+
+class _ProfiledCoroutine:
+    """Await a coroutine, profiling each of its steps."""
+
+    __slots__ = ("_coro", "_session")
+
+    def __init__(self, coro, session):
+        self._coro = coro
+        self._session = session
+
+    def __await__(self):
+        coro = self._coro
+        value, error = None, None
+        while True:
+            self._session.enable()
+            try:
+                if error is None:
+                    future = coro.send(value)
+                else:
+                    future = coro.throw(error)
+            except StopIteration as stop_iteration:
+                return stop_iteration.value
+            finally:
+                self._session.disable()
+
+            try:
+                value, error = (yield future), None
+            except BaseException as err:  # pylint: disable=broad-except
+                value, error = None, err
+
+
+def profiled(func):
+    """Profile func while a session is active, otherwise just call it."""
+    if iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            session = _SESSION
+            if session is None:
+                return await func(*args, **kwargs)
+            return await _ProfiledCoroutine(func(*args, **kwargs), session)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _SESSION
+        if session is None:
+            return func(*args, **kwargs)
+        session.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.disable()
+
+    return wrapper
+
+
+def async_register_profile_service(hass, domain):
+    """Register the <domain>.profile service."""
+    if hass.services.has_service(domain, SERVICE_PROFILE):
+        return
+
+    async def async_profile(call):
+        """Profile the custom components for the requested duration."""
+        session = start()
+        if session is None:
+            _LOGGER.warning("A profiling session is already running")
+            return
+
+        path = hass.config.path(
+            f"custom_components_profile.{dt_util.utcnow().strftime('%Y%m%d%H%M%S')}.prof"
+        )
+        _LOGGER.info(
+            "Profiling the custom components for %s seconds", call.data[CONF_DURATION]
+        )
+
+        async def async_finish(_now):
+            await hass.async_add_executor_job(stop().dump, path)
+            _LOGGER.info("Profile written to %s", path)
+
+        async_call_later(hass, call.data[CONF_DURATION], async_finish)
+
+    hass.services.async_register(domain, SERVICE_PROFILE, async_profile, PROFILE_SCHEMA)
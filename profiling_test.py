@@ -0,0 +1,83 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the on-demand profiler."""
+
+import asyncio
+import os
+import pstats
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from . import profiling
+from .profiling import profiled
+
+
+def busy():
+    return sum(range(1000))
+
+
+@profiled
+def sync_callback():
+    return busy()
+
+
+@profiled
+async def async_callback():
+    await asyncio.sleep(0)
+    return sync_callback() + busy()
+
+
+def unprofiled():
+    return busy()
+
+
+class TestProfiling(TestCase):
+    def tearDown(self):
+        profiling.stop()
+
+    def profiled_functions(self, session):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "profile.prof")
+            session.dump(path)
+            stats = pstats.Stats(path)
+            return {func[2] for func in stats.stats}
+
+    def test_inactive(self):
+        self.assertEqual(sync_callback(), busy())
+        self.assertEqual(asyncio.run(async_callback()), 2 * busy())
+
+    def test_session(self):
+        session = profiling.start()
+        self.assertIsNone(profiling.start())
+        unprofiled()
+        self.assertEqual(asyncio.run(async_callback()), 2 * busy())
+        self.assertIs(profiling.stop(), session)
+
+        functions = self.profiled_functions(session)
+        self.assertIn("async_callback", functions)
+        self.assertIn("sync_callback", functions)
+        self.assertIn("busy", functions)
+        self.assertNotIn("unprofiled", functions)
+
+    def test_exception(self):
+        @profiled
+        async def failing():
+            await asyncio.sleep(0)
+            raise ValueError()
+
+        session = profiling.start()
+        with self.assertRaises(ValueError):
+            asyncio.run(failing())
+        profiling.stop()
+        self.assertIn("failing", self.profiled_functions(session))
@@ -18,10 +18,13 @@ from datetime import datetime
 
 from homeassistant.const import ATTR_DATE, ATTR_TIME
 
+ATTR_DATETIME = "datetime"
 ATTR_SCHEDULE = "schedule"
 ATTR_SCHEDULES = "schedules"
 ATTR_INTERVAL = "interval"
+ATTR_NEXT_TRANSITION = "next_transition"
 ATTR_NEXT_UPDATE = "next_update"
+ATTR_WEEKDAY = "weekday"
 ATTR_DATE_TEMPLATE = f"{ATTR_DATE}_template"
 ATTR_TIME_TEMPLATE = f"{ATTR_TIME}_template"
 
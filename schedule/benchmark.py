@@ -0,0 +1,161 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Memory and throughput benchmark for large schedules.
+
+Run with:
+
+    python -m custom_components.schedule.benchmark --slots 1000 10000
+    python -m custom_components.schedule.benchmark --startup 100
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, time, timedelta
+import random
+from time import perf_counter
+import tracemalloc
+from unittest.mock import MagicMock
+
+from homeassistant.const import ATTR_NAME
+from homeassistant.helpers import entity_platform
+
+from . import ATTR_SCHEDULE
+from .schedule import Schedule, TimeSlot, WeekdaySlot
+from .sensor import async_setup_platform
+
+
+def build_slots(count, weekly=False):
+    """Build count static slots spread over a day (or week)."""
+    period = 7 * 86400 if weekly else 86400
+    slots = []
+    for index in range(count):
+        seconds = index * period // count
+        day, seconds = divmod(seconds, 86400)
+        start = time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+        if weekly:
+            slots.append(WeekdaySlot(f"slot {index}", day, start))
+        else:
+            slots.append(TimeSlot(f"slot {index}", start))
+    return slots
+
+
+def run(count, updates=10000, weekly=False, seed=0):
+    """Measure memory per slot and updates per second for count slots."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    slots = build_slots(count, weekly)
+    slot_bytes = tracemalloc.get_traced_memory()[0] - before
+    schedule = Schedule(None, None, None, slots)
+    total_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    base = datetime(2010, 1, 4)
+    times = [base + timedelta(seconds=rng.randrange(7 * 86400)) for _ in range(updates)]
+    start = perf_counter()
+    for date_time in times:
+        schedule.update(date_time)
+    elapsed = perf_counter() - start
+
+    return {
+        "slots": count,
+        "bytes_per_slot": slot_bytes // count,
+        "schedule_bytes": total_bytes,
+        "updates_per_s": int(updates / elapsed),
+    }
+
+
+class CountingTemplate:
+    """Stand-in for a Template that counts how often it is rendered."""
+
+    renders = 0
+
+    def __init__(self, template):
+        self.template = template
+        self.hass = None
+
+    def async_render(self):
+        CountingTemplate.renders += 1
+        return self.template
+
+
+def run_startup(count, slots=8, distinct=None):
+    """Measure platform setup of count sensors with templated slots.
+
+    The sensors use distinct schedule definitions (count by
+    default), identical definitions are shared.
+    """
+    distinct = distinct or count
+    hass = MagicMock()
+    hass.data = {}
+    hass.is_running = False
+    sensors = []
+    configs = [
+        {
+            ATTR_NAME: f"sensor {index}",
+            ATTR_SCHEDULE: [
+                TimeSlot(
+                    f"slot {slot} of {index % distinct}",
+                    None,
+                    CountingTemplate(f"{slot * 2}:00"),
+                )
+                for slot in range(slots)
+            ],
+        }
+        for index in range(count)
+    ]
+
+    async def setup():
+        entity_platform.current_platform.set(MagicMock())
+        for config in configs:
+            await async_setup_platform(hass, config, sensors.extend)
+
+    CountingTemplate.renders = 0
+    start = perf_counter()
+    asyncio.run(setup())
+    elapsed = perf_counter() - start
+    return {
+        "sensors": count,
+        "schedules": len({id(sensor.schedules[0]) for sensor in sensors}),
+        "setup_ms": round(elapsed * 1000, 2),
+        "setup_renders": CountingTemplate.renders,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--weekly", action="store_true")
+    parser.add_argument("--startup", type=int, metavar="SENSORS")
+    args = parser.parse_args()
+
+    if args.startup:
+        print(
+            "{sensors} sensors ({schedules} schedules): platform setup took {setup_ms} ms "
+            "and rendered {setup_renders} templates".format(**run_startup(args.startup))
+        )
+        return
+
+    for count in args.slots:
+        print(
+            "{slots:>6} slots: {bytes_per_slot} bytes/slot, "
+            "{schedule_bytes} bytes total, {updates_per_s} updates/s".format(
+                **run(count, args.updates, args.weekly)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
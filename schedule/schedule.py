@@ -1,42 +1,144 @@
 """Defines Schedule and ScheduleSlot."""
 
-from datetime import date as new_date
-from typing import Dict
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from datetime import date as new_date, datetime, time as new_time, timedelta
+from typing import Dict, List
 
-from homeassistant.const import ATTR_DATE, ATTR_NAME, ATTR_TIME
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from homeassistant.const import ATTR_DATE, ATTR_NAME, ATTR_TIME, WEEKDAYS
 from homeassistant.util import dt as dt_util
 
-from . import ATTR_DATE_TEMPLATE, ATTR_TIME_TEMPLATE, parse_date, parse_time
+from ..instrumentation import timed
+from . import (
+    ATTR_DATE_TEMPLATE,
+    ATTR_TIME_TEMPLATE,
+    ATTR_WEEKDAY,
+    parse_date,
+    parse_time,
+)
+
+
+@timed("schedule.template_render")
+def _render(template):
+    return template.async_render()
+
+
+def _rendered(template, renders):
+    """Render a template, only once for all slots sharing renders (id -> result)."""
+    if renders is None:
+        return _render(template)
+    key = id(template)
+    if key not in renders:
+        renders[key] = _render(template)
+    return renders[key]
+
+
+def _seconds(time):
+    """Convert a time into seconds since midnight."""
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+def _at(day, seconds, tzinfo):
+    """Get the datetime seconds after midnight of day."""
+    return datetime.combine(
+        day, new_time(seconds // 3600, seconds // 60 % 60, seconds % 60), tzinfo=tzinfo
+    )
 
 
-class ScheduleSlot:
-    """One slot in a schedule."""
+class ScheduleSlot(ABC):
+    """One slot in a schedule.
 
-    def __init__(self, name, converter):
+    Slots are compared using integer keys, start_key for the slot and
+    convert() for the datetime being checked, so the datetime only needs
+    converting once no matter how many slots are compared with it.
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
         """Create a schedule slot.
 
-        The slot must be named and must have a datetime converter
-        supplied.
+        The slot must be named.
         """
         self.name = name
-        self._converter = converter
+
+    @staticmethod
+    @abstractmethod
+    def convert(date_time):
+        """Convert a datetime into a key comparable with start_key."""
+
+    def fingerprint(self):
+        """Return a hashable value identifying this slot's definition."""
+        values = [type(self).__name__]
+        for cls in type(self).__mro__:
+            for attr in getattr(cls, "__slots__", ()):
+                value = getattr(self, attr)
+                # templates are identified by their source
+                values.append(getattr(value, "template", value))
+        return tuple(values)
+
+    @staticmethod
+    def epoch(local=None):
+        """Return what static start keys are computed for at local (or now).
+
+        Static start keys only need recomputing when this value changes.
+        """
+        return None
+
+    @staticmethod
+    @abstractmethod
+    def moment(key, local, wrapped):
+        """Convert a start key back into a datetime.
+
+        The key is placed in the day (week, year) of the local datetime, or
+        the next one when wrapped.
+        """
 
     @property
     def start(self):
         """Determine when this ScheduleSlot begins."""
+        return self.start_with()
+
+    @property
+    def start_key(self):
+        """Determine when this ScheduleSlot begins, as an integer key."""
+        return self.key()
+
+    @abstractmethod
+    def start_with(self, renders=None, epoch=None):
+        """Determine when this slot starts, sharing template renders through renders.
+
+        Static dates are placed in the year epoch.
+        """
+
+    @staticmethod
+    @abstractmethod
+    def key_of(start):
+        """Convert a start (as returned by start_with) into an integer key."""
+
+    def key(self, renders=None, epoch=None):
+        """Determine the start key, sharing template renders through renders."""
+        return self.key_of(self.start_with(renders, epoch))
 
     def after(self, date_time):
         """Determine if this ScheduleSlot comes after the given time."""
-        return self._converter(date_time) < self.start
+        return self.convert(date_time) < self.start_key
 
     def active_at(self, date_time):
         """Determine if this ScheduleSlot is active for the given time."""
-        return self.start <= self._converter(date_time)
+        return self.start_key <= self.convert(date_time)
 
 
 class TimeSlot(ScheduleSlot):
     """TimeSlot is a ScheduleSlot for a whole time (hh:mm:ss)."""
 
+    __slots__ = ("time", "time_template")
+
     @classmethod
     def from_config(cls, config: Dict) -> "TimeSlot":
         """Create a time slot from the supplied config/dict."""
@@ -47,27 +149,98 @@ class TimeSlot(ScheduleSlot):
         )
 
     def __init__(self, name, time, time_template=None):
-        super().__init__(name, lambda dt: dt.time())
+        super().__init__(name)
         self.time = time
         self.time_template = time_template
 
+    @staticmethod
+    def convert(date_time):
+        """Convert a datetime into seconds since midnight."""
+        return date_time.hour * 3600 + date_time.minute * 60 + date_time.second
+
+    @staticmethod
+    def moment(key, local, wrapped):
+        """Convert seconds since midnight into a datetime on the local day."""
+        return _at(local.date() + timedelta(days=wrapped), key, local.tzinfo)
+
     @property
     def interval(self):
         """Return the update interval (60 seconds)"""
         return 60
 
-    @property
-    def start(self):
+    def start_with(self, renders=None, epoch=None):
         """Determine when this time slot starts."""
         if self.time_template is None:
             return self.time
 
-        return parse_time(self.time_template.async_render())
+        return parse_time(_rendered(self.time_template, renders))
+
+    @staticmethod
+    def key_of(start):
+        """Convert a start time into seconds since midnight."""
+        return _seconds(start)
+
+
+class WeekdaySlot(ScheduleSlot):
+    """WeekdaySlot is a ScheduleSlot for a time on one day of the week."""
+
+    __slots__ = ("weekday", "time", "time_template")
+
+    @classmethod
+    def from_config(cls, config: Dict) -> List["WeekdaySlot"]:
+        """Create a weekday slot for every day listed in the supplied config/dict."""
+        return [
+            cls(
+                config[ATTR_NAME],
+                WEEKDAYS.index(weekday),
+                time=config.get(ATTR_TIME),
+                time_template=config.get(ATTR_TIME_TEMPLATE),
+            )
+            for weekday in config[ATTR_WEEKDAY]
+        ]
+
+    def __init__(self, name, weekday, time, time_template=None):
+        super().__init__(name)
+        self.weekday = weekday
+        self.time = time
+        self.time_template = time_template
+
+    @staticmethod
+    def convert(date_time):
+        """Convert a datetime into seconds since midnight on Monday."""
+        return date_time.weekday() * 86400 + TimeSlot.convert(date_time)
+
+    @staticmethod
+    def moment(key, local, wrapped):
+        """Convert seconds since Monday into a datetime in the local week."""
+        weekday, seconds = divmod(key, 86400)
+        monday = local.date() - timedelta(days=local.weekday()) + timedelta(weeks=wrapped)
+        return _at(monday + timedelta(days=weekday), seconds, local.tzinfo)
+
+    @property
+    def interval(self):
+        """Return the update interval (60 seconds)"""
+        return 60
+
+    def start_with(self, renders=None, epoch=None):
+        """Determine when this weekday slot starts, as (weekday, time)."""
+        if self.time_template is None:
+            return (self.weekday, self.time)
+
+        return (self.weekday, parse_time(_rendered(self.time_template, renders)))
+
+    @staticmethod
+    def key_of(start):
+        """Convert a (weekday, time) start into seconds since Monday."""
+        weekday, time = start
+        return weekday * 86400 + _seconds(time)
 
 
 class DateSlot(ScheduleSlot):
     """DateSlot is a ScheduleSlot for whole dates."""
 
+    __slots__ = ("date", "date_template")
+
     @classmethod
     def from_config(cls, config: Dict) -> "DateSlot":
         """Create a date slot from the supplied config/dict."""
@@ -78,27 +251,52 @@ class DateSlot(ScheduleSlot):
         )
 
     def __init__(self, name, date, date_template=None):
-        super().__init__(name, lambda dt: dt.date())
+        super().__init__(name)
         self.date = date
         self.date_template = date_template
 
+    @staticmethod
+    def convert(date_time):
+        """Convert a datetime into its (proleptic Gregorian) day number."""
+        return date_time.toordinal()
+
+    @staticmethod
+    def epoch(local=None):
+        """Static dates are placed in the year of local (or the current year)."""
+        if local is None:
+            local = dt_util.as_local(dt_util.now())
+        return local.year
+
+    @staticmethod
+    def moment(key, local, wrapped):
+        """Convert a day number into midnight of that day (a year later if wrapped)."""
+        day = new_date.fromordinal(key)
+        if wrapped:
+            try:
+                day = day.replace(year=day.year + 1)
+            except ValueError:
+                # February 29th
+                day = new_date(day.year + 1, 3, 1)
+        return _at(day, 0, local.tzinfo)
+
     @property
     def interval(self):
         """Return the update interval (86400 seconds)"""
         return 86400
 
-    @property
-    def start(self):
-        """Determine when this date slot starts."""
+    def start_with(self, renders=None, epoch=None):
+        """Determine when this date slot starts, in the year epoch if static."""
         if self.date_template is None:
-            _date = self.date
-            _date = new_date(
-                dt_util.as_local(dt_util.now()).year, self.date.month, self.date.day
-            )
+            if epoch is None:
+                epoch = self.epoch()
+            return new_date(epoch, self.date.month, self.date.day)
 
-            return _date
+        return parse_date(_rendered(self.date_template, renders))
 
-        return parse_date(self.date_template.async_render())
+    @staticmethod
+    def key_of(start):
+        """Convert a start date into its day number."""
+        return start.toordinal()
 
 
 class Schedule:
@@ -111,35 +309,134 @@ class Schedule:
         self._condition = condition
 
         self.slots = []
+        self._static = True
         for slot in slots:
             if hasattr(slot, "date_template") and slot.date_template is not None:
                 slot.date_template.hass = hass
+                self._static = False
             if hasattr(slot, "time_template") and slot.time_template is not None:
                 slot.time_template.hass = hass
+                self._static = False
             self.slots.append(slot)
-        self.slots.sort(key=lambda slot: slot.start, reverse=True)
+        # compiled lazily on the first update, templates may not be
+        # renderable until Home Assistant has started
+        self._epoch = None
+        self._starts = None
+        self._ordered = None
+        self._updated_at = None
+        self._next_transition = None
+
+    def _compile(self, epoch=None, renders=None):
+        """Build the ascending index of integer slot start keys.
+
+        Every template is rendered once, even when several slots share it
+        (a weekday slot listing several days), so templated schedules
+        recompile on every update while static ones are compiled only once
+        per epoch (static dates are placed in the epoch's year).
+        """
+        if renders is None:
+            renders = {}
+        index = sorted(
+            (
+                (slot.key(renders, epoch), -position, slot)
+                for position, slot in enumerate(self.slots)
+            ),
+            key=lambda entry: entry[:2],
+        )
+        return [entry[0] for entry in index], [entry[2] for entry in index]
+
+    def _index(self, slot_type, local, renders=None):
+        """Get the index compiled for the epoch of local, compiling it when needed."""
+        epoch = slot_type.epoch(local)
+        if not self._static:
+            return self._compile(epoch, renders)
+
+        if self._starts is None or epoch != self._epoch:
+            self._epoch = epoch
+            self._starts, self._ordered = self._compile(epoch)
+        return self._starts, self._ordered
 
     @property
     def name(self):
         """Get the schedule name."""
         return self._name
 
+    @timed("schedule.update")
     def update(self, date_time):
-        """Update the schedules internal state for the given datetime."""
+        """Update the schedules internal state for the given datetime.
 
-        date_time = dt_util.as_local(date_time)
-        if self.slots[-1].after(date_time):
-            self._state = self.slots[0].name
+        Schedules can be shared by several sensors, updating again for the
+        same datetime reuses the previous result.
+        """
+        if date_time == self._updated_at and date_time is not None:
             return self
 
-        for slot in self.slots:
-            if slot.active_at(date_time):
-                self._state = slot.name
-                return self
+        if not self.slots:
+            self._state = "unknown"
+            self._next_transition = None
+            return self
 
-        self._state = "unknown"
+        slot_type = type(self.slots[0])
+        local = dt_util.as_local(date_time)
+        starts, ordered = self._index(slot_type, local)
+        position = bisect_right(starts, slot_type.convert(local))
+        # times before the first slot wrap around to the last one
+        self._state = ordered[position - 1].name
+        if position < len(starts):
+            self._next_transition = slot_type.moment(starts[position], local, False)
+        else:
+            self._next_transition = slot_type.moment(starts[0], local, True)
+        self._updated_at = date_time
         return self
 
+    @timed("schedule.evaluate")
+    def evaluate(self, date_times):
+        """Determine the active slot name for each of the given datetimes.
+
+        Unlike update, the schedule's state is left untouched.  Templates
+        are rendered once for the whole batch.  The datetimes are grouped by
+        epoch (the year, for static dates), and each group is sorted once
+        and matched against the slot starts in a single merge pass (or with
+        numpy's searchsorted when numpy is available).
+        """
+        if not self.slots:
+            return ["unknown"] * len(date_times)
+
+        slot_type = type(self.slots[0])
+        # epoch -> (a local datetime in it, indices, keys)
+        groups = {}
+        for index, date_time in enumerate(date_times):
+            local = dt_util.as_local(date_time)
+            _, indices, keys = groups.setdefault(
+                slot_type.epoch(local), (local, [], [])
+            )
+            indices.append(index)
+            keys.append(slot_type.convert(local))
+
+        names = [None] * len(date_times)
+        renders = {}
+        for local, indices, keys in groups.values():
+            starts, ordered = self._index(slot_type, local, renders)
+            for index, name in zip(indices, self._match(starts, ordered, keys)):
+                names[index] = name
+        return names
+
+    @staticmethod
+    def _match(starts, ordered, keys):
+        """Get the name of the slot active at each of keys."""
+        if np is not None:
+            positions = np.searchsorted(starts, keys, side="right") - 1
+            return [ordered[position].name for position in positions.tolist()]
+
+        names = [None] * len(keys)
+        position = -1
+        for index in sorted(range(len(keys)), key=keys.__getitem__):
+            while position + 1 < len(starts) and starts[position + 1] <= keys[index]:
+                position += 1
+            # times before the first slot wrap around to the last one
+            names[index] = ordered[position].name
+        return names
+
     @property
     def interval(self):
         """Determine the update interval for this schedule."""
@@ -150,6 +447,11 @@ class Schedule:
         """Get the name of the active schedule slot."""
         return self._state
 
+    @property
+    def next_transition(self):
+        """Get when the next slot starts, as of the last update."""
+        return self._next_transition
+
     @property
     def active(self):
         """Determine if this schedule is active."""
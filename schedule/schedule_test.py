@@ -15,11 +15,13 @@
 
 from datetime import datetime
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from homeassistant.util import dt as dt_util
 
-from .schedule import DateSlot, Schedule, TimeSlot
+from .benchmark import CountingTemplate, build_slots
+from . import schedule as schedule_module
+from .schedule import DateSlot, Schedule, ScheduleSlot, TimeSlot, WeekdaySlot
 
 
 class TestScheduleSlot(TestCase):
@@ -49,6 +51,25 @@ class TestScheduleSlot(TestCase):
             DateSlot("", self.date(11, 1).date()).active_at(self.date(11, 1))
         )
 
+    def test_compact(self):
+        for slot in [
+            TimeSlot("", self.time(1, 0).time()),
+            WeekdaySlot("", 0, self.time(1, 0).time()),
+            DateSlot("", self.date(11, 1).date()),
+        ]:
+            self.assertFalse(hasattr(slot, "__dict__"))
+
+    def test_start_key(self):
+        self.assertEqual(TimeSlot("", self.time(1, 30).time()).start_key, 5400)
+        self.assertEqual(WeekdaySlot("", 2, self.time(1, 30).time()).start_key, 178200)
+        self.assertEqual(
+            DateSlot("", self.date(11, 1).date()).start_key,
+            self.date(11, 1).toordinal(),
+        )
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, ScheduleSlot, "")
+
 
 class TestSchedule(TestCase):
     def time(self, hour, minute):
@@ -77,3 +98,141 @@ class TestSchedule(TestCase):
         self.assertEqual(schedule.update(self.time(3, 0)).state, "t3")
         self.assertEqual(schedule.update(self.time(1, 0)).state, "t1")
         self.assertEqual(schedule.update(self.time(0, 0)).state, "t3")
+
+    def test_update_weekday_state(self):
+        # 2010-01-04 is a Monday
+        def at(day, hour, minute):
+            return datetime(2010, 1, 4 + day, hour, minute, 0)
+
+        schedule = Schedule(
+            None,
+            None,
+            None,
+            [
+                WeekdaySlot("wake", day, self.time(5, 0).time())
+                for day in range(5)
+            ]
+            + [
+                WeekdaySlot("wake", day, self.time(7, 0).time())
+                for day in range(5, 7)
+            ]
+            + [WeekdaySlot("sleep", day, self.time(21, 0).time()) for day in range(7)],
+        )
+        self.assertEqual(schedule.update(at(0, 5, 0)).state, "wake")
+        self.assertEqual(schedule.update(at(0, 4, 59)).state, "sleep")
+        self.assertEqual(schedule.update(at(5, 6, 0)).state, "sleep")
+        self.assertEqual(schedule.update(at(5, 7, 0)).state, "wake")
+        self.assertEqual(schedule.update(at(6, 22, 0)).state, "sleep")
+        # Monday morning wraps around to Sunday night
+        self.assertEqual(schedule.update(at(0, 0, 0)).state, "sleep")
+
+    def test_shared_template_rendered_once(self):
+        slots = WeekdaySlot.from_config(
+            {
+                "name": "wake",
+                "weekday": ["mon", "tue", "wed", "thu", "fri", "sat", "sun"],
+                "time_template": CountingTemplate("6:30"),
+            }
+        )
+        schedule = Schedule(None, None, None, slots)
+        CountingTemplate.renders = 0
+        self.assertEqual(schedule.update(datetime(2010, 1, 4, 7, 0)).state, "wake")
+        self.assertEqual(CountingTemplate.renders, 1)
+
+    def test_next_transition(self):
+        def utc(*args):
+            return datetime(*args, tzinfo=dt_util.UTC)
+
+        schedule = Schedule(
+            None,
+            None,
+            None,
+            [
+                TimeSlot("t1", self.time(1, 0).time()),
+                TimeSlot("t2", self.time(2, 0).time()),
+            ],
+        )
+        schedule.update(self.time(1, 30))
+        self.assertEqual(schedule.next_transition, utc(2010, 1, 1, 2, 0))
+        schedule.update(self.time(0, 30))
+        self.assertEqual(schedule.next_transition, utc(2010, 1, 1, 1, 0))
+        # past the last slot the first one starts the next day
+        schedule.update(self.time(2, 30))
+        self.assertEqual(schedule.next_transition, utc(2010, 1, 2, 1, 0))
+
+        # 2010-01-09 is a Saturday
+        schedule = Schedule(
+            None,
+            None,
+            None,
+            [WeekdaySlot("wake", 0, self.time(5, 0).time())]
+            + [WeekdaySlot("sleep", day, self.time(21, 0).time()) for day in range(7)],
+        )
+        schedule.update(datetime(2010, 1, 9, 6, 0))
+        self.assertEqual(schedule.next_transition, utc(2010, 1, 9, 21, 0))
+        schedule.update(datetime(2010, 1, 10, 22, 0))
+        self.assertEqual(schedule.next_transition, utc(2010, 1, 11, 5, 0))
+
+        schedule = Schedule(
+            None,
+            None,
+            None,
+            [
+                DateSlot("spring", datetime(1900, 3, 20).date()),
+                DateSlot("winter", datetime(1900, 12, 21).date()),
+            ],
+        )
+        with patch.object(dt_util, "now", return_value=utc(2010, 6, 1)):
+            schedule.update(datetime(2010, 6, 1, 12, 0))
+            self.assertEqual(schedule.next_transition, utc(2010, 12, 21))
+            schedule.update(datetime(2010, 12, 25, 12, 0))
+            self.assertEqual(schedule.next_transition, utc(2011, 3, 20))
+
+    def test_update_large_schedule(self):
+        slots = build_slots(5000)
+        schedule = Schedule(None, None, None, slots)
+        for minute in range(0, 24 * 60, 7):
+            date_time = datetime(2010, 1, 1, minute // 60, minute % 60, 0)
+            want = [slot for slot in slots if slot.active_at(date_time)][-1]
+            self.assertEqual(schedule.update(date_time).state, want.name)
+
+    def test_evaluate(self):
+        schedule = Schedule(None, None, None, build_slots(500))
+        times = [
+            datetime(2010, 1, 1, minute // 60, minute % 60, 0)
+            for minute in range(24 * 60 - 1, 0, -13)
+        ]
+        want = [schedule.update(date_time).state for date_time in times]
+        schedule.update(self.time(0, 0))
+        state = schedule.state
+
+        self.assertEqual(schedule.evaluate(times), want)
+        with patch.object(schedule_module, "np", None):
+            self.assertEqual(schedule.evaluate(times), want)
+        self.assertEqual(schedule.state, state)
+        self.assertEqual(schedule.evaluate([]), [])
+
+    def test_evaluate_years(self):
+        schedule = Schedule(
+            None,
+            None,
+            None,
+            [
+                DateSlot("spring", datetime(1900, 3, 20).date()),
+                DateSlot("winter", datetime(1900, 12, 21).date()),
+            ],
+        )
+        # 2012 is a leap year, so its March 20th is a different day of the year
+        times = [
+            datetime(2012, 3, 20, 12, 0),
+            datetime(2011, 3, 19, 12, 0),
+            datetime(2011, 3, 20, 12, 0),
+            datetime(2012, 3, 19, 12, 0),
+            datetime(2011, 12, 25, 12, 0),
+        ]
+        want = [schedule.update(date_time).state for date_time in times]
+        self.assertEqual(want, ["spring", "winter", "spring", "winter", "winter"])
+        with patch.object(dt_util, "now", return_value=datetime(2011, 6, 1)):
+            self.assertEqual(schedule.evaluate(times), want)
+            with patch.object(schedule_module, "np", None):
+                self.assertEqual(schedule.evaluate(times), want)
@@ -14,28 +14,64 @@
 """Platform for sensor integration."""
 
 from datetime import timedelta
+import logging
+import random
+from weakref import WeakValueDictionary
 
 import voluptuous as vol
 
-from homeassistant.const import ATTR_DATE, ATTR_NAME, ATTR_TIME, CONF_CONDITION
+from homeassistant.const import (
+    ATTR_DATE,
+    ATTR_ENTITY_ID,
+    ATTR_NAME,
+    ATTR_STATE,
+    ATTR_TIME,
+    CONF_CONDITION,
+    EVENT_HOMEASSISTANT_STARTED,
+    SERVICE_RELOAD,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+)
+from homeassistant.config import async_hass_config_yaml
 from homeassistant.core import callback
-from homeassistant.helpers import condition
+from homeassistant.helpers import condition, config_per_platform, entity_platform
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.event import async_track_point_in_utc_time
-from homeassistant.util import dt as dt_util
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.util import dt as dt_util, slugify
 
+from ..diagnostics import CONF_DIAGNOSTICS, async_setup_diagnostics
+from ..profiling import async_register_profile_service, profiled
 from . import (
+    ATTR_DATETIME,
     ATTR_INTERVAL,
+    ATTR_NEXT_TRANSITION,
     ATTR_NEXT_UPDATE,
     ATTR_DATE_TEMPLATE,
     ATTR_SCHEDULE,
     ATTR_SCHEDULES,
     ATTR_TIME_TEMPLATE,
+    ATTR_WEEKDAY,
     parse_date,
     parse_time,
 )
-from .schedule import DateSlot, Schedule, TimeSlot
+from .schedule import DateSlot, Schedule, TimeSlot, WeekdaySlot
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "schedule"
+DATA_SCHEDULES = f"{DOMAIN}_shared_schedules"
+# slugified name -> sensor, names must be unique
+DATA_SENSORS = f"{DOMAIN}_sensors"
+DATA_ADD_ENTITIES = f"{DOMAIN}_add_entities"
+
+# restored states are checked within this many seconds after startup
+RESTORE_CHECK_SPREAD = 30
+
+ATTR_DATETIMES = "datetimes"
+ATTR_RESULTS = "results"
+EVENT_SCHEDULE_EVALUATED = f"{DOMAIN}_evaluated"
+SERVICE_EVALUATE = "evaluate"
 
 _TIME_SCHEMA = vol.All(
     vol.Schema(
@@ -64,15 +100,41 @@ _DATE_SCHEMA = vol.All(
     DateSlot.from_config,
 )
 
+
+_WEEKDAY_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(ATTR_NAME): str,
+            vol.Required(ATTR_WEEKDAY): cv.weekdays,
+            vol.Exclusive(ATTR_TIME, "time"): vol.All(
+                vol.Datetime(format="%M:%S"), parse_time
+            ),
+            vol.Exclusive(ATTR_TIME_TEMPLATE, "time"): cv.template,
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_TIME, ATTR_TIME_TEMPLATE),
+    WeekdaySlot.from_config,
+)
+
+
+def _flatten(slots):
+    """Flatten the per-weekday slot lists into a single list."""
+    return [slot for day_slots in slots for slot in day_slots]
+
+
+_SLOTS_SCHEMA = vol.Any(
+    [_TIME_SCHEMA], [_DATE_SCHEMA], vol.All([_WEEKDAY_SCHEMA], _flatten)
+)
+
 _SCHEDULE_SCHEMA = vol.Or(
     vol.Schema(
         {
             vol.Optional(ATTR_NAME): str,
             vol.Optional(CONF_CONDITION): cv.CONDITION_SCHEMA,
-            vol.Required(ATTR_SCHEDULE): vol.Any([_TIME_SCHEMA], [_DATE_SCHEMA]),
+            vol.Required(ATTR_SCHEDULE): _SLOTS_SCHEMA,
         }
     ),
-    vol.Any([_TIME_SCHEMA], [_DATE_SCHEMA]),
+    _SLOTS_SCHEMA,
 )
 
 PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
@@ -80,41 +142,169 @@ PLATFORM_SCHEMA = cv.PLATFORM_SCHEMA.extend(
         vol.Required(ATTR_NAME): str,
         vol.Exclusive(ATTR_SCHEDULES, "schedule"): [_SCHEDULE_SCHEMA],
         vol.Exclusive(ATTR_SCHEDULE, "schedule"): _SCHEDULE_SCHEMA,
+        vol.Optional(CONF_DIAGNOSTICS, default=False): cv.boolean,
     }
 )
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the sensor platform."""
+    if config.get(CONF_DIAGNOSTICS):
+        await async_setup_diagnostics(hass, DOMAIN, async_add_entities)
+    async_register_profile_service(hass, DOMAIN)
+    _async_register_reload_service(hass)
+
+    sensors = hass.data.setdefault(DATA_SENSORS, {})
+    key = slugify(config[ATTR_NAME])
+    if key in sensors:
+        _LOGGER.error("Duplicate schedule name %s, not set up", config[ATTR_NAME])
+        return
+
+    schedules = await _async_get_schedules(hass, config)
+    sensor = sensors[key] = ScheduleSensor(hass, config[ATTR_NAME], schedules)
+    # sensors added by a reload have no platform entry of their own
+    hass.data.setdefault(DATA_ADD_ENTITIES, async_add_entities)
+    async_add_entities([sensor])
+
+    platform = entity_platform.current_platform.get()
+    platform.async_register_entity_service(
+        SERVICE_EVALUATE,
+        {vol.Required(ATTR_DATETIMES): vol.All(cv.ensure_list, [cv.datetime])},
+        "async_evaluate",
+    )
+
+
+def _freeze(value):
+    """Convert a config value into something hashable."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    # templates are identified by their source
+    return getattr(value, "template", value)
+
+
+def fingerprint(name, condition_config, slots):
+    """Return a hashable value identifying a schedule definition."""
+    return (
+        name,
+        _freeze(condition_config),
+        tuple(slot.fingerprint() for slot in slots),
+    )
+
+
+def _definitions(config):
+    """Get the (name, condition config, slots) of the schedules in a platform config."""
     scheds_config = config.get(ATTR_SCHEDULES)
-    schedules = []
     if scheds_config is None:
-        schedules = [Schedule(hass, None, None, config.get(ATTR_SCHEDULE))]
-    else:
-        for sched_config in scheds_config:
-            if_cond = None
-            if sched_config.get(CONF_CONDITION) is not None:
-                if_cond = await condition.async_from_config(
-                    hass, sched_config.get(CONF_CONDITION), False
-                )
-
-            schedules.append(
-                Schedule(
-                    hass,
-                    sched_config.get(ATTR_NAME),
-                    if_cond,
-                    sched_config.get(ATTR_SCHEDULE),
-                )
-            )
+        return [(None, None, config.get(ATTR_SCHEDULE))]
+    return [
+        (
+            sched_config.get(ATTR_NAME),
+            sched_config.get(CONF_CONDITION),
+            sched_config.get(ATTR_SCHEDULE),
+        )
+        for sched_config in scheds_config
+    ]
+
+
+async def _async_get_schedules(hass, config):
+    """Get the Schedules of a platform config."""
+    return [
+        await _async_get_schedule(hass, name, condition_config, slots)
+        for name, condition_config, slots in _definitions(config)
+    ]
+
+
+async def _async_get_schedule(hass, name, condition_config, slots):
+    """Get the Schedule for a definition, shared with identical definitions.
+
+    Sensors built from the same schedule definition (e.g. through YAML
+    anchors or packages) share a single Schedule and its template renders.
+    Schedules no sensor uses anymore are dropped automatically.
+    """
+    shared = hass.data.setdefault(DATA_SCHEDULES, WeakValueDictionary())
+    key = fingerprint(name, condition_config, slots)
+    schedule = shared.get(key)
+    if schedule is None:
+        if_cond = None
+        if condition_config is not None:
+            if_cond = await condition.async_from_config(hass, condition_config, False)
+
+        schedule = shared[key] = Schedule(hass, name, if_cond, slots)
+    return schedule
 
-    sensor = ScheduleSensor(hass, config[ATTR_NAME], schedules)
-    async_track_point_in_utc_time(
-        hass, sensor.point_in_time_listener, sensor.next_interval
-    )
-    async_add_entities([sensor])
 
+@callback
+def _async_register_reload_service(hass):
+    """Register the schedule.reload service."""
+    if hass.services.has_service(DOMAIN, SERVICE_RELOAD):
+        return
 
-class ScheduleSensor(Entity):
+    async def async_reload_service(call):
+        """Reload the schedule sensors from configuration.yaml."""
+        config = await async_hass_config_yaml(hass)
+        await async_reload(
+            hass,
+            [
+                platform_config
+                for platform, platform_config in config_per_platform(config, "sensor")
+                if platform == DOMAIN
+            ],
+        )
+
+    hass.services.async_register(DOMAIN, SERVICE_RELOAD, async_reload_service)
+
+
+async def async_reload(hass, configs):
+    """Apply new platform configs to the running schedule sensors.
+
+    The configs are validated like at setup.  Only sensors whose schedules
+    changed are touched: their changed Schedules are rebuilt (unchanged
+    ones are shared with the old definition, with their cached renders)
+    and their timer restarted.  Sensors no longer configured are removed
+    and new ones added.  A config that doesn't validate leaves its sensor
+    as it is, as does a config reusing the name of an earlier one.
+    """
+    sensors = hass.data.setdefault(DATA_SENSORS, {})
+    keys = set()
+    added = []
+    for raw_config in configs:
+        try:
+            config = PLATFORM_SCHEMA(raw_config)
+        except vol.Invalid as ex:
+            _LOGGER.error("Invalid schedule config, not reloaded: %s", ex)
+            if raw_config.get(ATTR_NAME) is not None:
+                keys.add(slugify(str(raw_config[ATTR_NAME])))
+            continue
+
+        name = config[ATTR_NAME]
+        key = slugify(name)
+        if key in keys:
+            _LOGGER.error("Duplicate schedule name %s, not reloaded", name)
+            continue
+        keys.add(key)
+        schedules = await _async_get_schedules(hass, config)
+        sensor = sensors.get(key)
+        if sensor is None:
+            sensor = sensors[key] = ScheduleSensor(hass, name, schedules)
+            added.append(sensor)
+        elif len(schedules) != len(sensor.schedules) or any(
+            new is not old for new, old in zip(schedules, sensor.schedules)
+        ):
+            _LOGGER.debug("Schedules of %s changed", name)
+            sensor.async_set_schedules(schedules)
+
+    for key in list(sensors):
+        if key not in keys:
+            _LOGGER.debug("Removing %s", sensors[key].name)
+            await sensors.pop(key).async_remove()
+
+    if added:
+        hass.data[DATA_ADD_ENTITIES](added)
+
+
+class ScheduleSensor(RestoreEntity):
     """Sensor that presents the current slot for a configured schedule."""
 
     def __init__(self, hass, name, schedules):
@@ -122,19 +312,122 @@ class ScheduleSensor(Entity):
         self.hass = hass
         self._name = name
         self._state = None
+        self._schedule = None
+        self._next_update = None
+        self._next_transition = None
+        self._unsub_timer = None
         self.schedules = schedules
-        self._update_internal_state(dt_util.utcnow())
+
+    async def async_added_to_hass(self):
+        """Restore the last state and start evaluating the schedule.
+
+        Evaluation renders the slot templates, so it waits until Home
+        Assistant has started and the entities they refer to exist.
+        """
+        last_state = await self.async_get_last_state()
+        if last_state is not None:
+            self._restore(last_state)
+
+        if self.hass.is_running:
+            self._async_start()
+        else:
+            self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STARTED, self._async_start
+            )
+
+    async def async_will_remove_from_hass(self):
+        """Stop the update timer."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    @callback
+    def async_set_schedules(self, schedules):
+        """Replace the schedules, re-evaluating straight away if started."""
+        self.schedules = schedules
+        self._schedule = None
+        self._state = None
+        self._next_transition = None
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+            self.point_in_time_listener(dt_util.utcnow())
+
+    def _restore(self, last_state):
+        """Take over the last state if it is still valid.
+
+        The state stays valid until the next transition it was stored with,
+        as long as the schedule that produced it is still configured.
+        """
+        next_transition = last_state.attributes.get(ATTR_NEXT_TRANSITION)
+        if isinstance(next_transition, str):
+            next_transition = dt_util.parse_datetime(next_transition)
+        if (
+            last_state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE)
+            or next_transition is None
+            or next_transition <= dt_util.utcnow()
+        ):
+            return
+
+        name = last_state.attributes.get(ATTR_SCHEDULE)
+        for schedule in self.schedules:
+            if schedule.name == name:
+                self._schedule = schedule
+                self._state = last_state.state
+                self._next_transition = next_transition
+                return
+
+    @callback
+    def _async_start(self, event=None):
+        """Evaluate the schedule for the first time.
+
+        A restored state is checked a little later instead, at a random
+        point in the first RESTORE_CHECK_SPREAD seconds (or the next update
+        if that is sooner), so a restart doesn't render every template at
+        once.
+        """
+        if self._state is None:
+            self.point_in_time_listener(dt_util.utcnow())
+            return
+
+        next_update = self.next_interval
+        check = dt_util.utcnow().replace(microsecond=0) + timedelta(
+            seconds=random.randint(1, RESTORE_CHECK_SPREAD)
+        )
+        if check < next_update:
+            self._next_update = check
+        self._unsub_timer = async_track_point_in_utc_time(
+            self.hass, self.point_in_time_listener, self._next_update
+        )
 
     @property
     def next_interval(self):
-        """Determine the next time the sensor should be updated"""
+        """Determine the next time the sensor should be updated.
+
+        That is the next multiple of the schedule's interval, or the next
+        transition if that comes first.
+        """
         interval = self._schedule.interval
         now = dt_util.utcnow()
         timestamp = int(dt_util.as_timestamp(now))
         delta = interval - (timestamp % interval)
-        self._next_update = now + timedelta(seconds=delta)
+        # whole seconds, so sensors sharing a schedule update it for the
+        # same datetime and share its renders
+        self._next_update = now.replace(microsecond=0) + timedelta(seconds=delta)
+        if (
+            self._next_transition is not None
+            and dt_util.as_utc(now)
+            < self._next_transition
+            < dt_util.as_utc(self._next_update)
+        ):
+            self._next_update = dt_util.as_utc(self._next_transition)
         return self._next_update
 
+    @property
+    def should_poll(self):
+        """The sensor updates itself on its own timer."""
+        return False
+
     @property
     def next_update(self):
         """The next time this sensor should be updated"""
@@ -153,29 +446,65 @@ class ScheduleSensor(Entity):
     @property
     def device_state_attributes(self):
         """Return the state attributes."""
+        if self._schedule is None:
+            return None
+
         return {
             ATTR_SCHEDULE: self._schedule.name,
             ATTR_INTERVAL: self._schedule.interval,
             ATTR_NEXT_UPDATE: self.next_update,
+            ATTR_NEXT_TRANSITION: self._next_transition,
         }
 
-    def _update_internal_state(self, date_time):
-        """Fetch new state data for the sensor."""
-
+    def _active_schedule(self):
+        """Get the currently active schedule."""
         for schedule in self.schedules:
-            # Get the currently active schedule
             if schedule.active:
-                self._schedule = schedule
-                break
+                return schedule
+
+        if self._schedule is None:
+            return self.schedules[-1]
+        return self._schedule
 
+    def _update_internal_state(self, date_time):
+        """Fetch new state data for the sensor."""
+        self._schedule = self._active_schedule()
         self._schedule.update(date_time)
         self._state = self._schedule.state
+        self._next_transition = self._schedule.next_transition
+
+    def evaluate(self, date_times):
+        """Determine the slot names for the datetimes without changing state.
+
+        The schedule is chosen by the conditions as they are now.
+        """
+        return self._active_schedule().evaluate(date_times)
+
+    async def async_evaluate(self, datetimes):
+        """Evaluate the datetimes and fire the results as an event."""
+        datetimes = [
+            date_time
+            if date_time.tzinfo is not None
+            else date_time.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+            for date_time in datetimes
+        ]
+        self.hass.bus.async_fire(
+            EVENT_SCHEDULE_EVALUATED,
+            {
+                ATTR_ENTITY_ID: self.entity_id,
+                ATTR_RESULTS: [
+                    {ATTR_DATETIME: date_time.isoformat(), ATTR_STATE: name}
+                    for date_time, name in zip(datetimes, self.evaluate(datetimes))
+                ],
+            },
+        )
 
     @callback
+    @profiled
     def point_in_time_listener(self, date_time):
         """Get the active schedule slot and update the state."""
         self._update_internal_state(date_time)
         self.async_schedule_update_ha_state()
-        async_track_point_in_utc_time(
+        self._unsub_timer = async_track_point_in_utc_time(
             self.hass, self.point_in_time_listener, self.next_interval
         )
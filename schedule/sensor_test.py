@@ -13,17 +13,34 @@
 # limitations under the License.
 """Test that the ScheduleSensor works."""
 
-from datetime import date, datetime, time
-from unittest import TestCase
+import asyncio
+from datetime import date, datetime, time, timedelta
+from unittest import IsolatedAsyncioTestCase, TestCase
 from unittest.mock import MagicMock
 
 import voluptuous as vol
 
 from homeassistant.util import dt as dt_util
 
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import State
+from homeassistant.helpers import entity_platform
+
 from . import parse_date, parse_time
-from .sensor import _DATE_SCHEMA, _SCHEDULE_SCHEMA, _TIME_SCHEMA, ScheduleSensor
-from .schedule import Schedule, DateSlot
+from . import sensor as sensor_module
+from .benchmark import CountingTemplate, run_startup
+from .sensor import (
+    _DATE_SCHEMA,
+    _SCHEDULE_SCHEMA,
+    _TIME_SCHEMA,
+    PLATFORM_SCHEMA,
+    RESTORE_CHECK_SPREAD,
+    ScheduleSensor,
+    async_reload,
+    async_setup_platform,
+)
+from .schedule import Schedule, DateSlot, TimeSlot
+from ..simulation import SIM_START, Simulation
 
 
 class TestDateTimeParsing(TestCase):
@@ -98,6 +115,13 @@ class TestSensorConfig(TestCase):
                     {"name": "d2", "date_template": "{{ '02/01' }}"},
                 ],
             },
+            {
+                "name": "test 4",
+                "input": [
+                    {"name": "w1", "weekday": ["mon", "tue"], "time": "05:00"},
+                    {"name": "w2", "weekday": "sat", "time": "07:00"},
+                ],
+            },
         ]
 
         for test in tests:
@@ -140,6 +164,22 @@ class TestSensorConfig(TestCase):
             except vol.MultipleInvalid:
                 self.fail("Failed to validate data")
 
+    def test_weekday_slots(self):
+        slots = _SCHEDULE_SCHEMA(
+            [
+                {"name": "w1", "weekday": ["mon", "tue"], "time": "05:00"},
+                {"name": "w2", "weekday": "sat", "time": "07:00"},
+            ]
+        )
+        self.assertEqual(
+            [(slot.name, slot.start) for slot in slots],
+            [
+                ("w1", (0, time(5, 0))),
+                ("w1", (1, time(5, 0))),
+                ("w2", (5, time(7, 0))),
+            ],
+        )
+
 
 class TestSensor(TestCase):
     def setUp(self):
@@ -162,6 +202,8 @@ class TestSensor(TestCase):
                 )
             ],
         )
+        # pylint: disable=protected-access
+        sensor._update_internal_state(dt_util.utcnow())
         self.assertEqual(
             sensor.next_interval, datetime(2010, 1, 2, 0, 0, 0), "Incorrect interval",
         )
@@ -169,3 +211,251 @@ class TestSensor(TestCase):
         self.assertEqual(
             sensor.next_interval, datetime(2010, 1, 2, 0, 0, 0), "Incorrect interval",
         )
+
+    def test_deferred_evaluation(self):
+        hass = MagicMock()
+        hass.is_running = False
+        CountingTemplate.renders = 0
+        sensor = ScheduleSensor(
+            hass,
+            None,
+            [Schedule(hass, None, None, [TimeSlot("", None, CountingTemplate("1:00"))])],
+        )
+        asyncio.run(sensor.async_added_to_hass())
+        self.assertEqual(CountingTemplate.renders, 0)
+        self.assertIsNone(sensor.state)
+        hass.bus.async_listen_once.assert_called_once()
+        self.assertEqual(
+            hass.bus.async_listen_once.call_args[0][0], EVENT_HOMEASSISTANT_STARTED
+        )
+
+    def test_startup_renders_nothing(self):
+        self.assertEqual(run_startup(100)["setup_renders"], 0)
+
+    def test_shared_schedules(self):
+        results = run_startup(100, distinct=10)
+        self.assertEqual(results["schedules"], 10)
+
+    def test_shared_update(self):
+        CountingTemplate.renders = 0
+        schedule = Schedule(
+            None, None, None, [TimeSlot("t1", None, CountingTemplate("1:00"))]
+        )
+        schedule.update(dt_util.utcnow())
+        schedule.update(dt_util.utcnow())
+        self.assertEqual(CountingTemplate.renders, 1)
+
+    def test_shared_update_aligned(self):
+        CountingTemplate.renders = 0
+        schedule = Schedule(
+            None, None, None, [TimeSlot("t1", None, CountingTemplate("1:00"))]
+        )
+        sensors = [ScheduleSensor(None, None, [schedule]) for _ in range(2)]
+        next_updates = []
+        # the sensors are scheduled a few microseconds apart
+        for microsecond, sensor in zip((141418, 141441), sensors):
+            dt_util.utcnow = MagicMock(
+                return_value=datetime(2010, 1, 1, 0, 0, 30, microsecond)
+            )
+            # pylint: disable=protected-access
+            sensor._update_internal_state(dt_util.utcnow())
+            next_updates.append(sensor.next_interval)
+        self.assertEqual(next_updates[0], next_updates[1])
+
+        renders = CountingTemplate.renders
+        for sensor, next_update in zip(sensors, next_updates):
+            sensor._update_internal_state(next_update)
+        self.assertEqual(CountingTemplate.renders, renders + 1)
+
+
+def day_config(name, morning="06:30"):
+    return {
+        "platform": "schedule",
+        "name": name,
+        "schedules": [
+            {
+                "name": "weekday",
+                "schedule": [
+                    {"name": "night", "time": "00:00"},
+                    {"name": "morning", "time_template": f"{{{{ '{morning}' }}}}"},
+                ],
+            },
+            {
+                "name": "weekend",
+                "schedule": [
+                    {"name": "night", "time": "00:00"},
+                    {"name": "morning", "time": "09:00"},
+                ],
+            },
+        ],
+    }
+
+
+class TestReload(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sim = Simulation()
+        self.sim.__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        entity_platform.current_platform.set(MagicMock())
+
+        self.sensors = {}
+        for name in ("Living Room", "Bedroom"):
+            await async_setup_platform(
+                self.sim.hass, PLATFORM_SCHEMA(day_config(name)), self.add_entities
+            )
+        await self.sim.async_settle()
+
+    def add_entities(self, entities):
+        for entity in entities:
+            self.sensors[entity.name] = entity
+        self.sim.hass.async_create_task(self.sim.async_add_entities(entities))
+
+    async def test_reload_changed(self):
+        living_room, bedroom = self.sensors["Living Room"], self.sensors["Bedroom"]
+        schedules, timer = list(bedroom.schedules), bedroom._unsub_timer
+        await self.sim.async_run(timedelta(hours=7))
+        self.assertEqual("morning", self.sim.states["sensor.bedroom"])
+
+        living_room_timer = living_room._unsub_timer
+        self.sim.reset()
+        await async_reload(
+            self.sim.hass, [day_config("Living Room"), day_config("Bedroom", "07:30")]
+        )
+        await self.sim.async_settle()
+
+        # untouched sensor keeps its schedules and timer
+        self.assertIs(living_room_timer, living_room._unsub_timer)
+        self.assertEqual(0, self.sim.counts.get("sensor.living_room", {}).get("renders", 0))
+
+        # only the changed schedule is rebuilt, re-evaluated straight away
+        self.assertIsNot(schedules[0], bedroom.schedules[0])
+        self.assertIs(schedules[1], bedroom.schedules[1])
+        self.assertIsNot(timer, bedroom._unsub_timer)
+        self.assertEqual("night", self.sim.states["sensor.bedroom"])
+        self.assertEqual("night", bedroom.state)
+
+    async def test_reload_added_removed(self):
+        await async_reload(
+            self.sim.hass,
+            [day_config("Living Room"), day_config("Kitchen"), {"name": "Bad"}],
+        )
+        await self.sim.async_settle()
+        self.assertIn("sensor.kitchen", self.sim.states)
+        self.assertNotIn("sensor.bedroom", self.sim.states)
+        self.assertIn("sensor.living_room", self.sim.states)
+
+    async def test_duplicate_name(self):
+        bedroom = self.sensors["Bedroom"]
+        with self.assertLogs(sensor_module._LOGGER, "ERROR"):
+            await async_setup_platform(
+                self.sim.hass,
+                PLATFORM_SCHEMA(day_config("bedroom", "07:30")),
+                self.add_entities,
+            )
+        await self.sim.async_settle()
+        self.assertIs(bedroom, self.sensors["Bedroom"])
+        self.assertNotIn("bedroom", self.sensors)
+
+        schedules = list(bedroom.schedules)
+        with self.assertLogs(sensor_module._LOGGER, "ERROR"):
+            await async_reload(
+                self.sim.hass,
+                [
+                    day_config("Living Room"),
+                    day_config("Bedroom"),
+                    day_config("bedroom", "07:30"),
+                ],
+            )
+        await self.sim.async_settle()
+        # the first config with the name wins, the sensor is kept
+        self.assertEqual(schedules, bedroom.schedules)
+        self.assertIn("sensor.bedroom", self.sim.states)
+        self.assertNotIn("bedroom", self.sensors)
+
+
+class TestRestore(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sim = Simulation(SIM_START + timedelta(hours=7))
+        self.sim.__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.sim.hass.is_running = False
+
+    async def add_sensor(self, next_transition, state="morning"):
+        self.sim.last_states["sensor.thermostat"] = State(
+            "sensor.thermostat",
+            state,
+            {"schedule": None, "next_transition": next_transition.isoformat()},
+        )
+        schedule = Schedule(
+            self.sim.hass,
+            None,
+            None,
+            [
+                TimeSlot("night", None, CountingTemplate("00:00")),
+                TimeSlot("morning", None, CountingTemplate("06:30")),
+            ],
+        )
+        sensor = ScheduleSensor(self.sim.hass, "Thermostat", [schedule])
+        await self.sim.async_add_entities([sensor])
+        return sensor
+
+    async def test_restore(self):
+        await self.add_sensor(SIM_START + timedelta(days=1))
+        # restored straight away and verified at the next update, not at start
+        self.assertEqual("morning", self.sim.states["sensor.thermostat"])
+        self.sim.reset()
+        await self.sim.async_start()
+        self.assertEqual({}, self.sim.counts)
+
+        await self.sim.async_run(timedelta(seconds=RESTORE_CHECK_SPREAD))
+        self.assertEqual(
+            {"wakeups": 1, "renders": 2, "state_writes": 1},
+            self.sim.counts["sensor.thermostat"],
+        )
+        self.assertEqual("morning", self.sim.states["sensor.thermostat"])
+
+    async def test_restore_outdated(self):
+        # e.g. the slot was edited, the restored state is corrected shortly
+        # after startup rather than at the next daily update
+        await self.add_sensor(SIM_START + timedelta(days=1), "night")
+        self.assertEqual("night", self.sim.states["sensor.thermostat"])
+        await self.sim.async_start()
+        await self.sim.async_run(timedelta(seconds=RESTORE_CHECK_SPREAD))
+        self.assertEqual("morning", self.sim.states["sensor.thermostat"])
+
+    async def test_restore_expired(self):
+        await self.add_sensor(SIM_START + timedelta(hours=6, minutes=30))
+        self.assertIsNone(self.sim.states["sensor.thermostat"])
+        await self.sim.async_start()
+        self.assertEqual("morning", self.sim.states["sensor.thermostat"])
+        self.assertEqual(2, self.sim.counts["sensor.thermostat"]["renders"])
+
+    async def test_next_transition(self):
+        self.sim.hass.is_running = True
+        sensor = await self.add_sensor(SIM_START)
+        await self.sim.async_run(timedelta(hours=16))
+        self.assertEqual(
+            SIM_START + timedelta(days=1),
+            sensor.device_state_attributes["next_transition"],
+        )
+
+    async def test_date_transition(self):
+        time_zone = dt_util.DEFAULT_TIME_ZONE
+        dt_util.set_default_time_zone(dt_util.get_time_zone("America/New_York"))
+        self.addCleanup(dt_util.set_default_time_zone, time_zone)
+        self.sim.hass.is_running = True
+        schedule = Schedule(
+            self.sim.hass,
+            None,
+            None,
+            [DateSlot("a", date(1900, 1, 1)), DateSlot("b", date(1900, 1, 5))],
+        )
+        await self.sim.async_add_entities(
+            [ScheduleSensor(self.sim.hass, "Dates", [schedule])]
+        )
+
+        # local midnight is 05:00 UTC, between the daily updates at 00:00 UTC
+        await self.sim.async_run(timedelta(hours=21, minutes=59))
+        self.assertEqual("a", self.sim.states["sensor.dates"])
+        await self.sim.async_run(timedelta(minutes=1))
+        self.assertEqual("b", self.sim.states["sensor.dates"])
@@ -0,0 +1,539 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time-warp simulation of the custom components.
+
+Drives entities against a stub hass through days or weeks of virtual time
+and counts the timer wakeups, template renders, HTTP requests and state
+writes of every entity.  Run with:
+
+    python -m custom_components.simulation --days 7
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+import heapq
+from importlib import import_module
+import inspect
+import math
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED, TEMP_FAHRENHEIT
+from homeassistant.core import Event, HassJob, State
+from homeassistant.helpers import event, update_coordinator
+from homeassistant.helpers.entity_component import DEFAULT_SCAN_INTERVAL
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.util import dt as dt_util, slugify
+
+from .feels_like import sensor as feels_like_sensor
+from .monoprice_rest import media_player
+from .monoprice_rest.stub_server import COMMANDS, StubServer, status_etag
+from .schedule import schedule as schedule_module, sensor as schedule_sensor
+
+METRICS = ("wakeups", "renders", "requests", "state_writes")
+
+SIM_URL = "http://monoprice.sim"
+SIM_START = datetime(2021, 1, 4, tzinfo=dt_util.UTC)
+
+# whoever is running right now, requests and renders are counted against it
+_OWNER = ContextVar("simulation_owner", default=None)
+
+
+class _Timer:
+    __slots__ = ("when", "seq", "action", "owner", "wakeup", "active")
+
+    def __init__(self, when, seq, action, owner, wakeup):
+        self.when = when
+        self.seq = seq
+        self.action = action
+        self.owner = owner
+        self.wakeup = wakeup
+        self.active = True
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class SimBus:
+    """Event bus that remembers fired events."""
+
+    def __init__(self):
+        self.listeners = {}
+        self.fired = []
+
+    def async_listen_once(self, event_type, listener):
+        self.listeners.setdefault(event_type, []).append(listener)
+        return lambda: self.listeners[event_type].remove(listener)
+
+    async_listen = async_listen_once
+
+    def async_fire(self, event_type, event_data=None):
+        self.fired.append((event_type, event_data))
+
+
+class SimServices:
+    """Service registry that only records registrations."""
+
+    def __init__(self):
+        self.services = {}
+
+    def has_service(self, domain, service):
+        return (domain, service) in self.services
+
+    def async_register(self, domain, service, service_func, schema=None):
+        self.services[(domain, service)] = service_func
+
+
+class SimHass:
+    """The parts of hass the custom components use, on virtual time."""
+
+    def __init__(self, simulation):
+        self._simulation = simulation
+        self.data = {}
+        self.is_running = True
+        self.is_stopping = False
+        self.bus = SimBus()
+        self.services = SimServices()
+        self.config = SimpleNamespace(
+            units=None, time_zone=dt_util.DEFAULT_TIME_ZONE, legacy_templates=False
+        )
+        self.states = {}
+
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+
+    def async_create_task(self, target):
+        task = self.loop.create_task(target)
+        self._simulation.tasks.append(task)
+        return task
+
+    async def async_add_executor_job(self, target, *args):
+        return target(*args)
+
+    def async_run_hass_job(self, job, *args):
+        return self._simulation.call(job.target, *args)
+
+
+class SimResponse:
+    """Response of the simulated Monoprice server."""
+
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.content_type = "application/json" if body is not None else "text/plain"
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+    async def text(self):
+        return str(self._body)
+
+
+class SimSession:
+    """aiohttp session answering from a StubServer's zones without sockets."""
+
+    closed = False
+
+    def __init__(self, simulation, server):
+        self._simulation = simulation
+        self._server = server
+
+    def _count(self, endpoint):
+        requests = self._server.requests
+        requests[endpoint] = requests.get(endpoint, 0) + 1
+        self._simulation.count("requests")
+
+    async def request(self, method, url, ssl=None, headers=None):
+        path = url[len(SIM_URL) + 1 :].split("/")
+        headers = headers or {}
+        server = self._server
+        if path == ["zones"]:
+            self._count(f"{method} /zones")
+            response = SimResponse(200, list(server.zones))
+        elif method == "GET":
+            self._count(f"{method} /{{zone}}/status")
+            zone = server.zones.get(int(path[0]))
+            etag = status_etag(zone) if zone is not None else None
+            if zone is None:
+                response = SimResponse(404)
+            elif server.etags and headers.get("If-None-Match") == etag:
+                response = SimResponse(304, headers={"ETag": etag})
+            else:
+                response = SimResponse(200, dict(zone), {"ETag": etag})
+        else:
+            self._count(f"{method} /{{zone}}/{{command}}/{{value}}")
+            zone = server.zones.get(int(path[0]))
+            if zone is None or path[1] not in COMMANDS:
+                response = SimResponse(404)
+            else:
+                zone[path[1]] = COMMANDS[path[1]](path[2])
+                response = SimResponse(200, dict(zone))
+
+        if headers.get("X-Auth-Key") != server.api_key:
+            return SimResponse(401)
+        return response
+
+
+class MemoryZoneCache:
+    """Zone cache kept in memory instead of a Store."""
+
+    def __init__(self):
+        self.servers = {}
+
+    async def async_get(self, url):
+        return self.servers.get(url)
+
+    def async_set(self, url, zones, statuses):
+        self.servers[url] = (list(zones), dict(statuses))
+
+
+def _scan_interval(module, domain):
+    """Scan interval EntityPlatform polls the entities of a platform module at."""
+    if hasattr(module, "SCAN_INTERVAL"):
+        return module.SCAN_INTERVAL
+    component = import_module(f"homeassistant.components.{domain}")
+    return getattr(component, "SCAN_INTERVAL", DEFAULT_SCAN_INTERVAL)
+
+
+class Simulation:
+    """Runs entities on a virtual clock and counts what they cost.
+
+    Entities that should be polled are polled at their platform's scan
+    interval like EntityPlatform would.  Counts are kept per entity id,
+    work done outside of an entity is counted against other owners (the
+    poll coordinator) or "simulation".
+    """
+
+    def __init__(self, start=SIM_START):
+        self.now = start
+        self.elapsed = timedelta()
+        self.hass = SimHass(self)
+        self.tasks = []
+        self.counts = {}
+        self.states = {}
+        # entity id -> State restored by RestoreEntity
+        self.last_states = {}
+        self._timers = []
+        self._seq = 0
+        self._state_listeners = {}
+        self._patches = [
+            patch.object(dt_util, "utcnow", self.utcnow),
+            patch.object(dt_util, "now", self.local_now),
+            patch.object(update_coordinator, "utcnow", self.utcnow),
+            patch.object(event, "async_track_point_in_utc_time", self.track_time),
+            patch.object(schedule_sensor, "async_track_point_in_utc_time", self.track_time),
+            patch.object(feels_like_sensor, "async_track_state_change", self.track_state),
+            patch.object(schedule_module, "_render", self._counting_render),
+            patch.object(RestoreEntity, "async_get_last_state", self._last_state()),
+        ]
+        self._render = schedule_module._render  # pylint: disable=protected-access
+
+    def __enter__(self):
+        for patcher in self._patches:
+            patcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patcher in reversed(self._patches):
+            patcher.stop()
+
+    def utcnow(self):
+        return self.now
+
+    def local_now(self, time_zone=None):
+        return self.now.astimezone(time_zone or dt_util.DEFAULT_TIME_ZONE)
+
+    @staticmethod
+    def owner_name(owner):
+        """Name counts are kept under for an owner."""
+        if owner is None:
+            return "simulation"
+        if isinstance(owner, str):
+            return owner
+        return getattr(owner, "entity_id", None) or getattr(owner, "name", None) or type(owner).__name__
+
+    def count(self, metric, owner=None):
+        """Count one metric against owner (by default whoever is running)."""
+        name = self.owner_name(owner if owner is not None else _OWNER.get())
+        self.counts.setdefault(name, Counter())[metric] += 1
+
+    def _last_state(self):
+        async def async_get_last_state(entity):
+            return self.last_states.get(entity.entity_id)
+
+        return async_get_last_state
+
+    def _counting_render(self, template):
+        self.count("renders")
+        return self._render(template)
+
+    def call(self, target, *args):
+        """Call a callback or coroutine function, running coroutines as tasks."""
+        result = target(*args)
+        if inspect.isawaitable(result):
+            return self.hass.async_create_task(result)
+        return result
+
+    def _schedule(self, when, action, owner, wakeup=True):
+        self._seq += 1
+        timer = _Timer(when, self._seq, action, owner, wakeup)
+        heapq.heappush(self._timers, timer)
+
+        def cancel():
+            timer.active = False
+
+        return cancel
+
+    def track_time(self, hass, action, point_in_time):
+        """Replacement for async_track_point_in_utc_time on the virtual clock."""
+        if isinstance(action, HassJob):
+            action = action.target
+        owner = getattr(action, "__self__", None)
+        return self._schedule(dt_util.as_utc(point_in_time), action, owner)
+
+    def track_state(self, hass, entity_ids, action):
+        """Replacement for async_track_state_change."""
+        entity_ids = [entity_ids] if isinstance(entity_ids, str) else entity_ids
+        for entity_id in entity_ids:
+            self._state_listeners.setdefault(entity_id, []).append(action)
+
+        def remove():
+            for entity_id in entity_ids:
+                self._state_listeners[entity_id].remove(action)
+
+        return remove
+
+    def set_state(self, entity_id, state, attributes=None):
+        """Set the state of a (source) entity, notifying its listeners."""
+        old_state = self.hass.states.get(entity_id)
+        new_state = self.hass.states[entity_id] = State(entity_id, state, attributes)
+        for action in list(self._state_listeners.get(entity_id, [])):
+            token = _OWNER.set(getattr(action, "__self__", None))
+            try:
+                self.call(action, entity_id, old_state, new_state)
+            finally:
+                _OWNER.reset(token)
+
+    def at(self, when, action, owner=None):
+        """Call action(now) at when, work it does is counted against owner."""
+        return self._schedule(when, action, owner, wakeup=False)
+
+    def every(self, interval, action, owner=None):
+        """Call action(now) every interval, e.g. to change source states."""
+
+        def run(now):
+            self.at(now + interval, run, owner)
+            return action(now)
+
+        return self.at(self.now + interval, run, owner)
+
+    def _write(self, entity):
+        self.count("state_writes", entity)
+        self.states[entity.entity_id] = entity.state
+
+    def _poll(self, entity, interval):
+        async def poll(now):
+            self._schedule(now + interval, poll, entity)
+            update = getattr(entity, "async_update", None)
+            if update is not None:
+                await update()
+            entity.async_write_ha_state()
+
+        self._schedule(self.now + interval, poll, entity)
+
+    async def async_add_entities(self, entities, domain=None):
+        """Add entities like an EntityPlatform, and poll them if they should be."""
+        for entity in entities:
+            module = sys.modules[type(entity).__module__]
+            platform = domain or module.__name__.rsplit(".", 1)[-1]
+            entity.hass = self.hass
+            entity.entity_id = f"{platform}.{slugify(entity.name)}"
+            entity.async_write_ha_state = lambda entity=entity: self._write(entity)
+            entity.async_schedule_update_ha_state = (
+                lambda force_refresh=False, entity=entity: self._write(entity)
+            )
+            entity.async_remove = lambda entity=entity: self.async_remove(entity)
+
+            token = _OWNER.set(entity)
+            try:
+                await entity.async_added_to_hass()
+            finally:
+                _OWNER.reset(token)
+            entity.async_write_ha_state()
+            if entity.should_poll:
+                self._poll(entity, _scan_interval(module, platform))
+        await self.async_settle()
+
+    async def async_remove(self, entity):
+        """Remove an entity, stopping its polling."""
+        for timer in self._timers:
+            if timer.owner is entity:
+                timer.active = False
+        await entity.async_will_remove_from_hass()
+        on_remove = entity._on_remove or []  # pylint: disable=protected-access
+        while on_remove:
+            on_remove.pop()()
+        self.states.pop(entity.entity_id, None)
+
+    async def async_add_monoprice(self, server, scan_interval=media_player.SCAN_INTERVAL):
+        """Set up a zone for every zone of a (not started) StubServer."""
+        monoprice = media_player.Monoprice(
+            SIM_URL, server.api_key, SimSession(self, server), context=False
+        )
+        coordinator = media_player.MonopriceCoordinator(
+            self.hass, monoprice, scan_interval, MemoryZoneCache()
+        )
+        sources = [{1: "Source 1"}, {"Source 1": 1}, ["Source 1"]]
+        zones = []
+
+        def add_zones(zone_ids):
+            zones.extend(
+                media_player.MonopriceZone(
+                    monoprice, sources, "monoprice_rest", zone_id, coordinator
+                )
+                for zone_id in zone_ids
+            )
+
+        await coordinator.async_zones()
+        coordinator.async_add_entry(None, add_zones)
+        await self.async_add_entities(zones)
+        return zones
+
+    async def async_start(self):
+        """Finish starting Home Assistant, for entities added while it wasn't running."""
+        self.hass.is_running = True
+        for listener in self.hass.bus.listeners.pop(EVENT_HOMEASSISTANT_STARTED, []):
+            token = _OWNER.set(getattr(listener, "__self__", None))
+            try:
+                self.call(listener, Event(EVENT_HOMEASSISTANT_STARTED))
+            finally:
+                _OWNER.reset(token)
+        await self.async_settle()
+
+    async def async_settle(self):
+        """Wait for the tasks started so far (and the ones they start)."""
+        while self.tasks:
+            tasks, self.tasks = self.tasks, []
+            await asyncio.gather(*tasks)
+
+    async def async_run(self, duration):
+        """Advance the virtual clock by duration, firing the timers due."""
+        end = self.now + duration
+        while self._timers and self._timers[0].when <= end:
+            timer = heapq.heappop(self._timers)
+            if not timer.active:
+                continue
+            self.now = max(self.now, timer.when)
+            if timer.wakeup:
+                self.count("wakeups", timer.owner)
+            token = _OWNER.set(timer.owner)
+            try:
+                self.call(timer.action, timer.when)
+            finally:
+                _OWNER.reset(token)
+            await self.async_settle()
+        self.now = end
+        self.elapsed += duration
+
+    def reset(self):
+        """Forget the counts so far, e.g. to leave out startup."""
+        self.counts = {}
+        self.elapsed = timedelta()
+
+    def report(self):
+        """Return {owner: {metric: count per simulated day}}."""
+        days = self.elapsed / timedelta(days=1) or 1
+        return {
+            name: {metric: round(counts[metric] / days, 2) for metric in METRICS}
+            for name, counts in sorted(self.counts.items())
+        }
+
+
+def outdoor(now):
+    """Deterministic daily temperature (F) and humidity (%) curves."""
+    hours = (now.hour * 3600 + now.minute * 60 + now.second) / 3600
+    swing = math.sin((hours - 9) / 24 * 2 * math.pi)
+    return round(75 + 12 * swing, 1), round(60 - 20 * swing)
+
+
+async def async_run_scenario(days, zones=6, commands=4):
+    """Run a schedule, feels like sensor and Monoprice zones for days."""
+    with Simulation() as sim:
+        slots = [
+            schedule_module.TimeSlot("night", time(0, 0)),
+            schedule_module.TimeSlot("morning", time(6, 30)),
+            schedule_module.TimeSlot("day", time(9, 0)),
+            schedule_module.TimeSlot("evening", time(18, 0)),
+        ]
+        schedule = schedule_module.Schedule(sim.hass, None, None, slots)
+        await sim.async_add_entities(
+            [schedule_sensor.ScheduleSensor(sim.hass, "Thermostat", [schedule])]
+        )
+
+        temp, humidity = "sensor.outdoor_temperature", "sensor.outdoor_humidity"
+        attributes = {"unit_of_measurement": TEMP_FAHRENHEIT}
+        sim.set_state(temp, outdoor(sim.now)[0], attributes)
+        sim.set_state(humidity, outdoor(sim.now)[1], {"unit_of_measurement": "%"})
+        await sim.async_add_entities(
+            [feels_like_sensor.FeelsLikeSensor(sim.hass, "Feels Like", temp, humidity, 2)]
+        )
+        sim.every(
+            timedelta(minutes=5),
+            lambda now: sim.set_state(temp, outdoor(now)[0], attributes),
+        )
+        sim.every(
+            timedelta(minutes=10),
+            lambda now: sim.set_state(
+                humidity, outdoor(now)[1], {"unit_of_measurement": "%"}
+            ),
+        )
+
+        server = StubServer(zones=zones)
+        entities = await sim.async_add_monoprice(server)
+        if commands:
+            for entity in entities:
+                sim.every(
+                    timedelta(days=1) / commands,
+                    lambda now, entity=entity: entity.async_turn_on()
+                    if entity.state != "on"
+                    else entity.async_turn_off(),
+                    entity,
+                )
+
+        sim.reset()
+        await sim.async_run(timedelta(days=days))
+        return sim.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--zones", type=int, default=6)
+    parser.add_argument("--commands", type=int, default=4, help="per zone per day")
+    args = parser.parse_args()
+
+    report = asyncio.run(async_run_scenario(args.days, args.zones, args.commands))
+    print(f"{'per day':40} " + " ".join(f"{metric:>12}" for metric in METRICS))
+    for name, counts in report.items():
+        print(f"{name:40} " + " ".join(f"{counts[metric]:>12}" for metric in METRICS))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Regression tests for the wakeups, renders, requests and writes per day."""
+
+from datetime import date, time, timedelta
+from unittest import IsolatedAsyncioTestCase
+
+from homeassistant.const import STATE_UNAVAILABLE, TEMP_FAHRENHEIT
+from homeassistant.core import State
+
+from .feels_like.sensor import FeelsLikeSensor
+from .monoprice_rest.stub_server import StubServer
+from .schedule.benchmark import CountingTemplate
+from .schedule.schedule import DateSlot, Schedule, TimeSlot
+from .schedule.sensor import ScheduleSensor
+from .simulation import Simulation
+
+DAY = timedelta(days=1)
+
+
+class TestSimulation(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sim = Simulation()
+        self.sim.__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+
+    async def add_schedule(self, name, slots):
+        schedule = Schedule(self.sim.hass, None, None, slots)
+        await self.sim.async_add_entities(
+            [ScheduleSensor(self.sim.hass, name, [schedule])]
+        )
+
+    async def test_time_schedule(self):
+        await self.add_schedule(
+            "Thermostat",
+            [TimeSlot("night", time(0, 0)), TimeSlot("morning", time(6, 30))],
+        )
+        self.sim.reset()
+        await self.sim.async_run(timedelta(hours=7))
+        self.assertEqual("morning", self.sim.states["sensor.thermostat"])
+
+        await self.sim.async_run(DAY - timedelta(hours=7))
+        self.assertEqual(
+            {"wakeups": 1440, "renders": 0, "requests": 0, "state_writes": 1440},
+            self.sim.report()["sensor.thermostat"],
+        )
+
+    async def test_templated_schedule(self):
+        await self.add_schedule(
+            "Templated",
+            [
+                TimeSlot("night", None, CountingTemplate("00:00")),
+                TimeSlot("day", None, CountingTemplate("08:00")),
+            ],
+        )
+        self.sim.reset()
+        await self.sim.async_run(DAY)
+        self.assertEqual(
+            {"wakeups": 1440, "renders": 2880, "requests": 0, "state_writes": 1440},
+            self.sim.report()["sensor.templated"],
+        )
+
+    async def test_date_schedule(self):
+        await self.add_schedule(
+            "Season",
+            [DateSlot("winter", date(2000, 12, 21)), DateSlot("spring", date(2000, 3, 20))],
+        )
+        self.sim.reset()
+        await self.sim.async_run(7 * DAY)
+        self.assertEqual(
+            {"wakeups": 1, "renders": 0, "requests": 0, "state_writes": 1},
+            self.sim.report()["sensor.season"],
+        )
+
+    async def test_feels_like(self):
+        temp, humidity = "sensor.temperature", "sensor.humidity"
+        self.sim.set_state(temp, 70, {"unit_of_measurement": TEMP_FAHRENHEIT})
+        self.sim.set_state(humidity, 50, {"unit_of_measurement": "%"})
+        await self.sim.async_add_entities(
+            [FeelsLikeSensor(self.sim.hass, "Feels Like", temp, humidity, 2)]
+        )
+        # seeded from the sources' current states
+        self.assertEqual(70, self.sim.states["sensor.feels_like"])
+        self.sim.every(
+            timedelta(minutes=5),
+            lambda now: self.sim.set_state(
+                temp, 85, {"unit_of_measurement": TEMP_FAHRENHEIT}
+            ),
+        )
+        self.sim.every(
+            timedelta(minutes=10),
+            lambda now: self.sim.set_state(humidity, 50, {"unit_of_measurement": "%"}),
+        )
+        self.sim.reset()
+        await self.sim.async_run(DAY)
+        report = self.sim.report()["sensor.feels_like"]
+        self.assertEqual(0, report["wakeups"])
+        self.assertEqual(288 + 144, report["state_writes"])
+
+    async def test_feels_like_restore(self):
+        temp, humidity = "sensor.temperature", "sensor.humidity"
+        self.sim.set_state(temp, 85, {"unit_of_measurement": TEMP_FAHRENHEIT})
+        self.sim.set_state(humidity, STATE_UNAVAILABLE)
+        self.sim.last_states["sensor.feels_like"] = State("sensor.feels_like", "88.5")
+        await self.sim.async_add_entities(
+            [FeelsLikeSensor(self.sim.hass, "Feels Like", temp, humidity, 2)]
+        )
+        self.assertEqual(88.5, self.sim.states["sensor.feels_like"])
+
+        self.sim.set_state(humidity, 50, {"unit_of_measurement": "%"})
+        await self.sim.async_settle()
+        self.assertEqual(86.46, self.sim.states["sensor.feels_like"])
+
+    async def test_monoprice(self):
+        server = StubServer(zones=2)
+        zones = await self.sim.async_add_monoprice(server)
+        self.assertEqual(["off", "off"], [zone.state for zone in zones])
+
+        self.sim.reset()
+        self.sim.at(
+            self.sim.now + timedelta(hours=1),
+            lambda now: zones[0].async_turn_on(),
+            zones[0],
+        )
+        await self.sim.async_run(timedelta(hours=2))
+        report = self.sim.report()
+
+        coordinator = report["monoprice_rest http://monoprice.sim"]
+        self.assertEqual(8640, coordinator["wakeups"])
+        self.assertEqual(2 * 8640, coordinator["requests"])
+        self.assertEqual(0, coordinator["state_writes"])
+        # the command and the refresh after it, one write for the change
+        self.assertEqual(
+            {"wakeups": 0, "renders": 0, "requests": 24, "state_writes": 12},
+            report["media_player.zone_11"],
+        )
+        self.assertEqual("on", self.sim.states["media_player.zone_11"])
@@ -0,0 +1,73 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cached client SSL context that trusts a local CA certificate."""
+
+from os import path, stat
+import ssl
+from threading import Lock
+
+from homeassistant.util import ssl as hassl
+
+# trusted by the clients of these components, next to custom_components
+CA_FILE = path.join(path.dirname(__file__), "..", "ca-cert.pem")
+
+
+class CachedClientContext:
+    """Cached homeassistant.util.ssl.client_context that trusts a CA file.
+
+    The context is built by the original factory the first time it is
+    requested and the CA file is loaded into it.  Later calls return the
+    same context until the CA file's modification time changes.  Building
+    the context does blocking disk I/O, so callers in the event loop should
+    go through hass.async_add_executor_job.  A caller that keeps the
+    context should fetch it again now and then to pick up a new CA file.
+    """
+
+    def __init__(self, factory, ca_file):
+        self.factory = factory
+        self.ca_file = ca_file
+        self._lock = Lock()
+        self._context = None
+        self._mtime = None
+
+    def _ca_mtime(self):
+        try:
+            return stat(self.ca_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def __call__(self) -> ssl.SSLContext:
+        mtime = self._ca_mtime()
+        context = self._context
+        if context is not None and mtime == self._mtime:
+            return context
+
+        with self._lock:
+            if self._context is None or mtime != self._mtime:
+                context = self.factory()
+                if mtime is not None:
+                    context.load_verify_locations(self.ca_file)
+                self._context = context
+                self._mtime = mtime
+            return self._context
+
+    def invalidate(self):
+        """Drop the cached context so the next call rebuilds it."""
+        with self._lock:
+            self._context = None
+            self._mtime = None
+
+
+# the context of this package's clients, Home Assistant's own is left alone
+client_context = CachedClientContext(hassl.client_context, CA_FILE)
@@ -0,0 +1,80 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the cached client SSL context."""
+
+import os
+import ssl
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from homeassistant.util import ssl as hassl
+
+from . import ssl_context
+from .ssl_context import CachedClientContext
+
+
+class TestCachedClientContext(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.ca_file = os.path.join(self.tmpdir.name, "ca-cert.pem")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_no_ca_file(self):
+        factory = MagicMock(side_effect=lambda: MagicMock())
+        client_context = CachedClientContext(factory, self.ca_file)
+        context = client_context()
+        self.assertIs(client_context(), context)
+        self.assertEqual(factory.call_count, 1)
+        context.load_verify_locations.assert_not_called()
+
+    def test_reload_on_mtime_change(self):
+        with open(self.ca_file, "w") as ca_file:
+            ca_file.write("")
+        factory = MagicMock(side_effect=lambda: MagicMock())
+        client_context = CachedClientContext(factory, self.ca_file)
+
+        context = client_context()
+        context.load_verify_locations.assert_called_once_with(self.ca_file)
+        self.assertIs(client_context(), context)
+
+        stat = os.stat(self.ca_file)
+        os.utime(self.ca_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        reloaded = client_context()
+        self.assertIsNot(reloaded, context)
+        reloaded.load_verify_locations.assert_called_once_with(self.ca_file)
+        self.assertEqual(factory.call_count, 2)
+
+    def test_cached_is_faster(self):
+        calls = 20
+        start = perf_counter()
+        for _ in range(calls):
+            ssl.create_default_context()
+        uncached = perf_counter() - start
+
+        client_context = CachedClientContext(ssl.create_default_context, self.ca_file)
+        start = perf_counter()
+        for _ in range(calls):
+            client_context()
+        cached = perf_counter() - start
+
+        self.assertLess(cached, uncached)
+
+    def test_hass_context_untouched(self):
+        self.assertNotIsInstance(hassl.client_context, CachedClientContext)
+        self.assertIsNot(hassl.client_context(), hassl.client_context())
+        self.assertIs(ssl_context.client_context(), ssl_context.client_context())
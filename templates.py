@@ -0,0 +1,59 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Date helpers made available to Home Assistant templates."""
+
+from datetime import date, timedelta
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def nth_day(year, month, dow, week):
+    """Determine the nth weekday of a month."""
+    date_time = date(year, month, 1)
+    delta = 0
+    if date_time.weekday() <= dow:
+        delta = dow - date_time.weekday()
+    else:
+        delta = (7 - date_time.weekday()) + dow
+
+    date_time = date(year, month, 1 + 7 * (week - 1))
+    return date_time + timedelta(days=delta)
+
+
+@lru_cache(maxsize=256)
+def last_day(year, month, dow):
+    """Determine the last weekday of a month."""
+    if month == 12:
+        date_time = date(year, 12, 31)
+    else:
+        date_time = date(year, month + 1, 1) - timedelta(days=1)
+
+    return date_time - timedelta(days=(date_time.weekday() - dow) % 7)
+
+
+@lru_cache(maxsize=64)
+def easter(year):
+    """Determine the date of (western) Easter Sunday for the given year."""
+    # Anonymous Gregorian algorithm (Meeus/Jones/Butcher)
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
@@ -0,0 +1,59 @@
+# Copyright 2020 Andrew Bates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the template date helpers."""
+
+from datetime import date
+from unittest import TestCase
+
+from jinja2 import Environment, defaults as jinja_defaults
+
+from . import register_template_helpers
+from .templates import easter, last_day, nth_day
+
+
+class TestTemplateHelpers(TestCase):
+    def test_nth_day(self):
+        # Thanksgiving, fourth Thursday of November
+        self.assertEqual(nth_day(2020, 11, 3, 4), date(2020, 11, 26))
+        self.assertEqual(nth_day(2021, 11, 3, 4), date(2021, 11, 25))
+        # Labor day, first Monday of September
+        self.assertEqual(nth_day(2020, 9, 0, 1), date(2020, 9, 7))
+
+    def test_last_day(self):
+        # Memorial day, last Monday of May
+        self.assertEqual(last_day(2020, 5, 0), date(2020, 5, 25))
+        self.assertEqual(last_day(2021, 5, 0), date(2021, 5, 31))
+        self.assertEqual(last_day(2020, 12, 3), date(2020, 12, 31))
+
+    def test_easter(self):
+        tests = {
+            2000: date(2000, 4, 23),
+            2019: date(2019, 4, 21),
+            2020: date(2020, 4, 12),
+            2024: date(2024, 3, 31),
+            2038: date(2038, 4, 25),
+        }
+        for year, want in tests.items():
+            self.assertEqual(easter(year), want)
+
+
+class TestRegistration(TestCase):
+    def test_register_idempotent(self):
+        helper = jinja_defaults.DEFAULT_NAMESPACE["nth_day"]
+        register_template_helpers()
+        self.assertIs(jinja_defaults.DEFAULT_NAMESPACE["nth_day"], helper)
+
+    def test_render(self):
+        template = Environment().from_string("{{ nth_day(2020, 11, 3, 4) }}")
+        self.assertEqual(template.render(), "2020-11-26")